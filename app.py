@@ -5,8 +5,9 @@ import pandas as pd
 
 # Import project modules
 from utils.state import init_state
-from utils.io import load_csv_semicolon, maybe_read_parquet, write_parquet
-from utils.prep import clean, filter_values
+from utils.io import load_clean_csv, maybe_read_parquet, write_parquet
+from utils.prep import prepare, month_labels, frame_digest
+from utils.filters import filter_catalog
 import constants
 
 # Attempt to import download function
@@ -19,6 +20,9 @@ except ImportError:
     def download_and_save(url, path): pass
     DATA_URL = ""
 
+# Copy-on-write: filtered frames and assign() share untouched columns instead of deep-copying them
+pd.set_option("mode.copy_on_write", True)
+
 # Page config
 st.set_page_config(
     page_title="TGV Punctuality Dashboard",
@@ -71,29 +75,30 @@ if "df_clean" not in st.session_state:
                 st.error(f"Raw data file missing at `{DATA_CSV_PATH}` and download unavailable.")
                 st.stop()
 
-        # Load the CSV
+        # Load and clean the CSV (cached across sessions per file version)
         try:
-            df_raw = load_csv_semicolon(DATA_CSV_PATH)
+            with st.spinner("Cleaning and preparing data..."):
+                df_clean = load_clean_csv(DATA_CSV_PATH)
         except Exception as load_error:
             st.error(f"Failed to load CSV file: {load_error}")
             st.stop()
 
-        # Clean the data
-        with st.spinner("Cleaning and preparing data..."):
-            df_clean = clean(df_raw)
-
-        # Attempt to save cleaned data to Parquet
+        # Attempt to save cleaned data to Parquet (categoricals are stored dictionary-encoded)
         try:
             write_parquet(df_clean, PARQUET_PATH)
         except Exception as write_error:
             st.warning(f"Could not save Parquet cache ({PARQUET_PATH.name}): {write_error}")
 
     else: 
-        df_clean = dfp
+        # Caches written before the categorical layout are upgraded here
+        df_clean = prepare(dfp)
 
     # Store and prepare filters
     st.session_state.df_clean = df_clean
-    st.session_state.filters_catalog = filter_values(df_clean)
+    # Content fingerprint so cached filter results are shared only across identical datasets
+    st.session_state.data_version = frame_digest(df_clean)
+    st.session_state.filters_catalog = filter_catalog(df_clean, st.session_state.data_version)
+    st.session_state["_month_col"], st.session_state["_month_series"] = month_labels(df_clean)
 
     # Initialize date range filters
     if "date_start" not in st.session_state or "date_end" not in st.session_state:
@@ -292,7 +292,7 @@ if not ds.empty:
     # 12-month averages per class
     read12 = (
         ds.dropna(subset=["on_time_pct"])
-          .groupby("duration_class", sort=False)
+          .groupby("duration_class", sort=False, observed=True)
           .apply(lambda g: g.tail(12)["on_time_pct"].mean() if len(g) >= 12 else np.nan, include_groups=False)
           .rename("avg12")
           .reset_index()
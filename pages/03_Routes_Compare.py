@@ -185,7 +185,7 @@ if on_col and sev_col and len(summ):
 
 extra = ""
 if color_by == "service" and on_col and sev_col:
-    comp = (summ.groupby("service")[[on_col, sev_col]]
+    comp = (summ.groupby("service", observed=True)[[on_col, sev_col]]
                  .median()
                  .rename(columns={on_col:"med_on", sev_col:"med_sev"}))
     if "National" in comp.index and "International" in comp.index:
@@ -197,7 +197,7 @@ if color_by == "service" and on_col and sev_col:
             f"{'The gap narrows once A↔B are merged.' if treat_bi else 'The split is clearer when directions are separated.'}"
         )
 elif color_by == "duration_class" and on_col and sev_col:
-    comp = (summ.groupby("duration_class")[[on_col, sev_col]]
+    comp = (summ.groupby("duration_class", observed=True)[[on_col, sev_col]]
                  .median()
                  .rename(columns={on_col:"med_on", sev_col:"med_sev"}))
     short_on = comp.get("med_on", {}).get("< 1h30", np.nan)
@@ -359,7 +359,7 @@ else:
 
 # Dynamic local read
 if "duration_class" in dd.columns and "avg_delay_arr_delayed_min" in dd.columns:
-    stats = (dd.groupby("duration_class")["avg_delay_arr_delayed_min"]
+    stats = (dd.groupby("duration_class", observed=True)["avg_delay_arr_delayed_min"]
                .agg(median="median", p90=lambda s: s.quantile(0.90))
                .round(0))
     short_m = float(stats.loc["< 1h30","median"]) if "< 1h30" in stats.index else np.nan
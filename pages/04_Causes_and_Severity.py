@@ -19,6 +19,7 @@ from utils.viz import (
     grouped_severity_by_cause,     
     scatter_dominant_cause         
 )
+from utils.schema import COMPOSITION_LABELS, cause_cols_in
 
 st.set_page_config(page_title="Causes & Severity", page_icon=":material/stacked_bar_chart:", layout="wide")
 
@@ -54,26 +55,15 @@ def _weighted_cause_shares(df):
     """
     if df is None or df.empty:
         return None
-    cause_cols = [c for c in [
-        "pct_cause_external","pct_cause_infra","pct_cause_traffic",
-        "pct_cause_rollingstock","pct_cause_station_reuse","pct_cause_passengers"
-    ] if c in df.columns]
+    cause_cols = cause_cols_in(df)
     if not cause_cols or "late_arr_count" not in df.columns:
         return None
-    w = df["late_arr_count"].fillna(0).astype(float)
+    w = df["late_arr_count"].to_numpy(dtype=np.float64, na_value=0.0)
     den = w.sum()
     if den <= 0:
         return None
-    num = df[cause_cols].multiply(w, axis=0).sum() / den
-    label_map = {
-        "pct_cause_external": "External",
-        "pct_cause_infra": "Infrastructure",
-        "pct_cause_traffic": "Traffic management",
-        "pct_cause_rollingstock": "Rolling stock",
-        "pct_cause_station_reuse": "Station ops & reuse",
-        "pct_cause_passengers": "Passengers / PSH / connections",
-    }
-    num.index = [label_map.get(i, i) for i in num.index]
+    num = pd.Series(w @ df[cause_cols].to_numpy(dtype=np.float64, na_value=0.0) / den, index=cause_cols)
+    num.index = [COMPOSITION_LABELS.get(i, i) for i in num.index]
     return num.sort_values(ascending=False)
 
 # Sidebar
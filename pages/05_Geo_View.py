@@ -78,7 +78,7 @@ def _detect_station_cols_or_parse(edges: pd.DataFrame) -> tuple[pd.DataFrame, st
             return s, ""
         return parts[0].strip(), parts[1].strip()
 
-    parsed = edges["liaison"].apply(_split_liaison)
+    parsed = edges["liaison"].astype(str).apply(_split_liaison)
     edges2 = edges.copy()
     edges2["__dep_name__"] = parsed.map(lambda t: t[0])
     edges2["__arr_name__"] = parsed.map(lambda t: t[1])
@@ -453,7 +453,7 @@ with tab_hubs:
         b = df_pairs.rename(columns={"arrival": "station", "departure": "partner"})
         deg = pd.concat([a, b], axis=0, ignore_index=True)
         deg = deg[deg["station"].notna() & deg["partner"].notna()]
-        deg = deg.groupby("station")["partner"].nunique().reset_index(name="liaisons_count")
+        deg = deg.groupby("station", observed=True)["partner"].nunique().reset_index(name="liaisons_count")
 
         s = deg.merge(
             stations[["station", "on_time_pct", "late_arr_count", "circulated"]],
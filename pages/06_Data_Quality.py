@@ -1,13 +1,18 @@
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import plotly.express as px
 
 from utils.filters import dq_sidebar
-from utils.compute import apply_overview_filters
+from utils.compute import _filter_signature, apply_overview_filters
+from utils.schema import source_cols_in
 from utils.quality import (
     missingness_table,
+    duplicate_masks,
     duplicate_keys,
+    full_row_duplicates,
     bounds_issues,
     logical_consistency,
     outlier_months,
@@ -19,6 +24,7 @@ def analysis_card(title: str, body_md: str, icon: str = ":material/analytics:"):
         st.markdown(f"{icon} **{title}**")
         st.markdown(body_md)
 
+@st.cache_data(show_spinner=False)
 def _normalize_missing_table(miss_raw: pd.DataFrame | None, n_rows: int) -> pd.DataFrame:
     if miss_raw is None or (isinstance(miss_raw, pd.DataFrame) and miss_raw.empty):
         return pd.DataFrame(columns=["Column", "Missing %", "Missing count", "Non-null %"])
@@ -87,7 +93,15 @@ def _normalize_missing_table(miss_raw: pd.DataFrame | None, n_rows: int) -> pd.D
 
     keep = ["Column", "Missing %", "Missing count", "Non-null %"]
     extras = [c for c in m.columns if c not in keep]
-    return m[keep + extras]
+    return m[keep + extras].sort_values("Missing %", ascending=False, na_position="last")
+
+def _preview(df: pd.DataFrame, n: int) -> pa.Table | pd.DataFrame:
+    """First n rows as an Arrow table (only those rows are converted), pandas fallback for mixed objects."""
+    head = df.head(int(n))
+    try:
+        return pa.Table.from_pandas(head, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return head
 
 def _dq_bounds_info_md() -> str:
     return """
@@ -130,15 +144,35 @@ def _extract_month_col(dd: pd.DataFrame) -> pd.Series | None:
 
 def _dq_score(n, miss_tbl, dup_df, bdf, ldf, odf) -> int:
     """Lightweight DQ score out of 100."""
-    score = 100.0
-    if not miss_tbl.empty and "Missing %" in miss_tbl.columns:
-        score -= 0.5 * float(miss_tbl["Missing %"].mean())  # avg missing% weighted 0.5
-    if n > 0 and not dup_df.empty:
-        score -= min(10.0, 100.0 * len(dup_df) / n)        # cap at 10
-    for df_issues, cap in [(bdf, 15.0), (ldf, 15.0), (odf, 15.0)]:
-        if n > 0 and df_issues is not None and not df_issues.empty:
-            score -= min(cap, 100.0 * len(df_issues) / n)
-    return max(0, int(round(score)))
+    has_missing = not miss_tbl.empty and "Missing %" in miss_tbl.columns
+    miss_pen = 0.5 * float(miss_tbl["Missing %"].mean()) if has_missing else 0.0  # avg missing% weighted 0.5
+
+    # Issue rates (% of rows) for duplicates, bounds, logic, outliers; capped at 10/15/15/15
+    counts = np.array([0 if d is None else len(d) for d in (dup_df, bdf, ldf, odf)], dtype=float)
+    caps = np.array([10.0, 15.0, 15.0, 15.0])
+    penalties = np.minimum(caps, 100.0 * counts / max(n, 1))
+
+    score = 100.0 - np.nan_to_num(miss_pen) - penalties.sum()
+    return int(round(np.clip(score, 0, 100)))
+
+# The scoped frame is skipped from hashing (leading underscore); the filter signature (data_version first) identifies it
+@st.cache_data(show_spinner=False)
+def _dq_passes(_dff: pd.DataFrame, filter_sig: tuple, iqr_k: float) -> dict:
+    """Run the independent DQ checks concurrently (pandas/NumPy release the GIL on numeric paths)."""
+    def _dups(d):
+        key_mask, full_mask = duplicate_masks(d)
+        return duplicate_keys(d, key_mask=key_mask), full_row_duplicates(d, full_mask=full_mask)
+
+    passes = {
+        "missing": missingness_table,
+        "dups": _dups,
+        "bounds": bounds_issues,
+        "logic": logical_consistency,
+        "outliers": lambda d: outlier_months(d, method="iqr", threshold=iqr_k),
+    }
+    with ThreadPoolExecutor(max_workers=len(passes)) as ex:
+        futures = {name: ex.submit(fn, _dff) for name, fn in passes.items()}
+        return {name: f.result() for name, f in futures.items()}
 
 # Page
 st.set_page_config(page_title="Data Quality", page_icon=":material/award_star:", layout="wide")
@@ -164,17 +198,22 @@ dff = apply_overview_filters(df, st.session_state)
 if dff.empty:
     st.info("No data in current filter. Adjust the filters on the left.")
     st.stop()
+# Load-time helper columns are left out of every check and table below
+dff = dff[source_cols_in(dff)]
 
-month_str = _extract_month_col(dff)
+# Month labels resolved once at load time; probe only if the session lacks them
+month_all = st.session_state.get("_month_series")
+month_str = month_all.reindex(dff.index) if month_all is not None else _extract_month_col(dff)
 IQR_K = 1.5 
 
 # Summary calculations
 n_rows, n_cols = dff.shape
-cols_missing = _normalize_missing_table(missingness_table(dff), len(dff))
-dup_keys = duplicate_keys(dff)
-b_issues = bounds_issues(dff)
-logic = logical_consistency(dff)
-outs = outlier_months(dff, method="iqr", threshold=IQR_K)
+dq = _dq_passes(dff, _filter_signature(st.session_state), IQR_K)
+cols_missing = _normalize_missing_table(dq["missing"], len(dff))
+dup_keys, dup_full = dq["dups"]
+b_issues = dq["bounds"]
+logic = dq["logic"]
+outs = dq["outliers"]
 
 score = _dq_score(n_rows, cols_missing, dup_keys, b_issues, logic, outs)
 tone = "success" if score >= 90 else "warning" if score >= 75 else "error"
@@ -205,12 +244,10 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(["Missingness", "Duplicates", "Bounds", "
 # Missingness
 with tab1:
     st.subheader("Missingness by column")
-    miss = cols_missing.copy()
+    miss = cols_missing
     if miss.empty:
         st.success("No missing values detected.")
     else:
-        if "Missing %" in miss.columns:
-            miss = miss.sort_values("Missing %", ascending=False)
         st.dataframe(miss, use_container_width=True, hide_index=True)
 
         try:
@@ -225,19 +262,18 @@ with tab1:
 
         if month_str is not None:
             try:
-                dfm = dff.copy()
-                dfm["_month"] = month_str
-                heat = []
-                for col in dff.columns:
-                    pct_by_m = dfm.groupby("_month")[col].apply(lambda s: s.isna().mean() * 100).rename(col)
-                    heat.append(pct_by_m)
-                heat_df = pd.concat(heat, axis=1).sort_index()
+                heat_df = (dff.isna().groupby(month_str.to_numpy()).mean() * 100).sort_index()
+                # Smaller payload: 1-decimal float32 cells, drop columns never missing
+                heat_df = heat_df.round(1).astype(np.float32)
+                heat_df = heat_df.loc[:, heat_df.any()]
                 if not heat_df.empty:
                     fig_hm = px.imshow(
                         heat_df.T,
                         aspect="auto",
                         title="Missingness heatmap by month & column (%)",
                         color_continuous_scale="Reds",
+                        zmin=0,
+                        zmax=100,
                     )
                     fig_hm.update_layout(template="plotly_white", height=420, margin=dict(l=8, r=8, t=32, b=8))
                     st.plotly_chart(fig_hm, use_container_width=True)
@@ -257,10 +293,6 @@ with tab2:
     st.subheader("Potential duplicates")
     st.caption("Checked on key: **(date, service, departure, arrival)**. Also scans for full-row duplicates.")
     dups_key = dup_keys
-    try:
-        dup_full = dff[dff.duplicated(keep=False)].copy()
-    except Exception:
-        dup_full = pd.DataFrame()
 
     if dups_key.empty and (dup_full.empty or len(dup_full) == 0):
         st.success("No duplicates detected.")
@@ -272,7 +304,7 @@ with tab2:
         if not dups_key.empty:
             st.warning(f"{len(dups_key)} duplicated key rows.")
             if show_samples:
-                st.dataframe(dups_key.head(max_rows_preview), use_container_width=True, hide_index=True)
+                st.dataframe(_preview(dups_key, max_rows_preview), use_container_width=True, hide_index=True)
                 st.caption(f"Showing up to {max_rows_preview} rows.")
             else:
                 st.caption("Preview hidden (toggle in Data Quality options).")
@@ -280,7 +312,7 @@ with tab2:
         if not dup_full.empty:
             if show_samples:
                 with st.expander("Exact-row duplicates (all columns match)"):
-                    st.dataframe(dup_full.head(max_rows_preview), use_container_width=True, hide_index=True)
+                    st.dataframe(_preview(dup_full, max_rows_preview), use_container_width=True, hide_index=True)
             else:
                 st.caption("Exact-row duplicates detected (preview hidden).")
 
@@ -294,11 +326,11 @@ with tab3:
     else:
         st.warning(f"{len(b)} rows with bounds issues.")
         if "column" in b.columns:
-            grp = b.groupby("column").size().reset_index(name="rows").sort_values("rows", ascending=False)
+            grp = b["column"].value_counts().rename_axis("column").reset_index(name="rows")
             st.markdown("**Issues by column**")
             st.dataframe(grp, use_container_width=True, hide_index=True)
         if show_samples:
-            st.dataframe(b.head(max_rows_preview), use_container_width=True, hide_index=True)
+            st.dataframe(_preview(b, max_rows_preview), use_container_width=True, hide_index=True)
             st.caption(f"Showing up to {max_rows_preview} rows.")
         else:
             st.caption("Bounds issues detected (preview hidden).")
@@ -313,11 +345,11 @@ with tab4:
     else:
         st.warning(f"{len(l)} violations of business rules.")
         if "rule" in l.columns:
-            per_rule = l.groupby("rule").size().reset_index(name="violations").sort_values("violations", ascending=False)
+            per_rule = l["rule"].value_counts().rename_axis("rule").reset_index(name="violations")
             st.markdown("**Violations by rule**")
             st.dataframe(per_rule, use_container_width=True, hide_index=True)
         if show_samples:
-            st.dataframe(l.head(max_rows_preview), use_container_width=True, hide_index=True)
+            st.dataframe(_preview(l, max_rows_preview), use_container_width=True, hide_index=True)
             st.caption(f"Showing up to {max_rows_preview} rows.")
         else:
             st.caption("Logical rule violations detected (preview hidden).")
@@ -334,15 +366,15 @@ with tab4:
 with tab5:
     st.subheader("Outlier months (unusually low on-time % per liaison)")
     st.caption(f"Method: **IQR (interquartile range)** — threshold **k = {IQR_K}**")
-    out = outlier_months(dff, method="iqr", threshold=IQR_K)
+    out = outs
 
     if out.empty:
         st.info("No outlier months flagged with current parameters.")
     else:
         if "liaison" in out.columns:
-            counts = out.groupby("liaison").size().reset_index(name="outlier_months").sort_values("outlier_months", ascending=False)
+            counts = out.groupby("liaison", observed=True).size().nlargest(30).reset_index(name="outlier_months")
             st.markdown("**Liaisons with most outlier months**")
-            st.dataframe(counts.head(30), use_container_width=True, hide_index=True)
+            st.dataframe(counts, use_container_width=True, hide_index=True)
         if show_samples:
             st.dataframe(out, use_container_width=True, hide_index=True)
         else:
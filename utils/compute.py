@@ -1,103 +1,216 @@
+import functools
+import itertools
+import weakref
 import streamlit as st
 import pandas as pd
 import numpy as np
 from typing import Optional
 
-def _between_ym(df: pd.DataFrame, start_ym: str, end_ym: str) -> pd.Series:
-    start = pd.to_datetime(start_ym, format="%Y-%m", errors="coerce")
-    end = pd.to_datetime(end_ym, format="%Y-%m", errors="coerce")
-    return (df["date"] >= start) & (df["date"] <= end)
+from utils.prep import f64, month_key, pair_columns, pct
+from utils.schema import BUCKET_COLS, CAUSE_LABELS, COMPOSITION_LABELS, bucket_cols_in, cause_cols_in
+
+def _group_sums(values: np.ndarray, w: np.ndarray, codes: np.ndarray, ngroups: int):
+    # sum(values * w) per group for each column and sum(w), one bincount per column over integer group ids
+    weighted = values * w[:, None]
+    num = np.column_stack([np.bincount(codes, weights=col, minlength=ngroups) for col in weighted.T])
+    den = np.bincount(codes, weights=w, minlength=ngroups)
+    return num, den
+
+def _weighted_sums(values: pd.DataFrame, w, key):
+    # Groups come out sorted and observed-only, like groupby(key, observed=True); missing values count as 0
+    codes, uniques = pd.factorize(key, sort=True)
+    valid = codes >= 0
+    num, den = _group_sums(
+        values.to_numpy(dtype=np.float64, na_value=0.0)[valid],
+        np.asarray(w, dtype=np.float64)[valid],
+        codes[valid],
+        len(uniques),
+    )
+    index = pd.Index(uniques, name=key.name)
+    return pd.DataFrame(num, index=index, columns=values.columns), pd.Series(den, index=index, name="_w")
+
+def _safe_divide(num: pd.DataFrame, den) -> pd.DataFrame:
+    # Row-wise num / den with NaN where den == 0 (same result as den.replace(0, np.nan))
+    den = np.asarray(den, dtype=np.float64)[:, None]
+    arr = num.to_numpy(dtype=np.float64)
+    out = np.divide(arr, den, out=np.full_like(arr, np.nan), where=den != 0)
+    return pd.DataFrame(out, index=num.index, columns=num.columns)
+
+def _between_ym(df: pd.DataFrame, start_ym: str, end_ym: str) -> np.ndarray:
+    start = pd.to_datetime(start_ym, format="%Y-%m", errors="coerce").to_datetime64()
+    end = pd.to_datetime(end_ym, format="%Y-%m", errors="coerce").to_datetime64()
+    dates = df["date"].to_numpy()
+    return (dates >= start) & (dates <= end)
+
+def _isin(s: pd.Series, values) -> np.ndarray:
+    # Categorical columns are matched on their integer codes
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        wanted = s.cat.categories.get_indexer(list(values))
+        return np.isin(s.cat.codes.to_numpy(), wanted[wanted >= 0])
+    return s.isin(values).to_numpy()
 
 def _normalize_pair_cols(df: pd.DataFrame) -> pd.DataFrame:
-    dep = df["departure"].astype(str)
-    arr = df["arrival"].astype(str)
-    left_first = (dep <= arr)
-    df = df.copy()
-    df["dep_norm"] = np.where(left_first, dep, arr)
-    df["arr_norm"] = np.where(left_first, arr, dep)
-    df["liaison_norm"] = df["dep_norm"] + " ↔ " + df["arr_norm"]
-    return df
+    # No-op when the loader already added the pair columns
+    return pair_columns(df)
+
+def _filter_signature(session) -> tuple:
+    return (
+        session.get("data_version"),
+        session["date_start"], session["date_end"],
+        tuple(session.get("service") or ()),
+        tuple(session.get("duration_class") or ()),
+        tuple(session.get("departures", []) or ()),
+        tuple(session.get("arrivals", []) or ()),
+        bool(session.get("treat_bidirectional", False)),
+    )
 
-def apply_overview_filters(df: pd.DataFrame, session) -> pd.DataFrame:
-    mask = _between_ym(df, session["date_start"], session["date_end"])
-    if session.get("service"):
-        mask &= df["service"].isin(session["service"])
-    if session.get("duration_class"):
-        mask &= df["duration_class"].isin(session["duration_class"])
+def _filter_positions(df: pd.DataFrame, sig: tuple) -> np.ndarray:
+    _, date_start, date_end, services, durations, dep_sel, arr_sel, treat_bi = sig
+    mask = _between_ym(df, date_start, date_end)
+    if services:
+        np.logical_and(mask, _isin(df["service"], services), out=mask)
+    if durations:
+        np.logical_and(mask, _isin(df["duration_class"], durations), out=mask)
 
     # Station filters
-    dep_sel = session.get("departures", []) or []
-    arr_sel = session.get("arrivals", []) or []
-    treat_bi = bool(session.get("treat_bidirectional", False))
-
     if dep_sel or arr_sel:
         if treat_bi:
             # Match by endpoints regardless of direction
-            m_dep = True if not dep_sel else (df["departure"].isin(dep_sel) | df["arrival"].isin(dep_sel))
-            m_arr = True if not arr_sel else (df["departure"].isin(arr_sel) | df["arrival"].isin(arr_sel))
-            mask &= (m_dep & m_arr)
+            for sel in (dep_sel, arr_sel):
+                if sel:
+                    np.logical_and(mask, _isin(df["departure"], sel) | _isin(df["arrival"], sel), out=mask)
         else:
             if dep_sel:
-                mask &= df["departure"].isin(dep_sel)
+                np.logical_and(mask, _isin(df["departure"], dep_sel), out=mask)
             if arr_sel:
-                mask &= df["arrival"].isin(arr_sel)
+                np.logical_and(mask, _isin(df["arrival"], arr_sel), out=mask)
+
+    return np.flatnonzero(mask)
 
-    return df.loc[mask].copy()
+# The loaded frame is skipped from hashing (leading underscore); data_version in the signature identifies it
+@st.cache_data(show_spinner=False, ttl=None, max_entries=32)
+def _cached_filter_positions(_df: pd.DataFrame, sig: tuple) -> np.ndarray:
+    return _filter_positions(_df, sig)
 
+def apply_overview_filters(df: pd.DataFrame, session) -> pd.DataFrame:
+    sig = _filter_signature(session)
+    if sig[0] is None:
+        pos = _filter_positions(df, sig)
+    else:
+        pos = _cached_filter_positions(df, sig)
+
+    if len(pos) == len(df):
+        # Filters keep every row (the default view): share the columns instead of gathering them
+        out = df.copy(deep=False)
+    else:
+        # take() gathers into a new frame, so no extra copy is needed
+        out = df.take(pos)
+    # Stamp the frame so memoized computations can key on the filters instead of hashing rows
+    return _stamp(out, sig)
+
+# Stamp tokens are never reused (unlike id()) and stay picklable inside attrs; the registry only holds
+# weak references, so a token resolves to its frame while that frame is alive
+_STAMP_TOKENS = itertools.count()
+_STAMPED = weakref.WeakValueDictionary()
+
+def _stamp(out: pd.DataFrame, sig: tuple) -> pd.DataFrame:
+    # attrs are copied onto every frame derived from out; the token only resolves to out itself
+    token = next(_STAMP_TOKENS)
+    _STAMPED[token] = out
+    out.attrs["filter_sig"] = sig
+    out.attrs["filter_frame"] = token
+    return out
+
+def _stamped_sig(df: pd.DataFrame) -> tuple | None:
+    # The filter signature when df is the stamped frame itself (not a frame derived from it), else None
+    attrs = getattr(df, "attrs", {})
+    if _STAMPED.get(attrs.get("filter_frame")) is not df:
+        return None
+    return attrs.get("filter_sig")
+
+def restamp(out: pd.DataFrame, src: pd.DataFrame, *extra) -> pd.DataFrame:
+    # A frame derived from a stamped filter result gets its own stamp (src signature + extra),
+    # so memoized functions called on it can still hit the cache
+    sig = _stamped_sig(src)
+    if sig is not None:
+        _stamp(out, sig + extra)
+    return out
+
+_MEMOIZED = {}
+
+@st.cache_data(show_spinner=False, ttl=None, max_entries=32 * 16)
+def _memo_call(name: str, sig: tuple, args: tuple, kwargs: tuple, _df_filt: pd.DataFrame):
+    return _MEMOIZED[name](_df_filt, *args, **dict(kwargs))
+
+def _memoized(fn):
+    # Cache fn(df_filt, ...) on the filter signature (data_version included); frames derived from df_filt
+    # carry a stale stamp and bypass it
+    _MEMOIZED[fn.__name__] = fn
+
+    @functools.wraps(fn)
+    def wrapper(df_filt: pd.DataFrame, *args, **kwargs):
+        sig = _stamped_sig(df_filt)
+        if sig is None or sig[0] is None:
+            return fn(df_filt, *args, **kwargs)
+        return _memo_call(fn.__name__, sig, args, tuple(sorted(kwargs.items())), df_filt)
+
+    return wrapper
+
+@_memoized
 def kpis_overview(df_filt: pd.DataFrame) -> dict:
     if df_filt.empty:
         return {"on_time_pct": np.nan, "cancel_rate_pct": np.nan, "avg_arr_delay_delayed": np.nan}
 
-    total_planned = df_filt["planned"].fillna(0).sum()
-    total_canceled = df_filt["canceled"].fillna(0).sum()
-    total_circulated = df_filt["circulated"].fillna(0).sum()
-    total_late_arr = df_filt["late_arr_count"].fillna(0).sum()
+    # One pass over the four count columns; missing counts read as 0
+    counts = df_filt[["planned", "canceled", "circulated", "late_arr_count"]].to_numpy(dtype=np.float64, na_value=0.0)
+    total_planned, total_canceled, total_circulated, total_late_arr = counts.sum(axis=0)
 
     on_time_pct = ( (total_circulated - total_late_arr) / total_circulated * 100.0 ) if total_circulated > 0 else np.nan
     cancel_rate_pct = ( total_canceled / total_planned * 100.0 ) if total_planned > 0 else np.nan
 
-    delays = df_filt["avg_delay_arr_delayed_min"].astype(float)
-    weights = df_filt["late_arr_count"].fillna(0).astype(float)
+    delays = np.nan_to_num(f64(df_filt["avg_delay_arr_delayed_min"]))
+    weights = counts[:, 3]
     w = weights.sum()
-    avg_arr_delay_delayed = float((delays * weights).sum() / w) if w > 0 else np.nan
+    avg_arr_delay_delayed = float(np.dot(delays, weights) / w) if w > 0 else np.nan
 
     return {"on_time_pct": on_time_pct, "cancel_rate_pct": cancel_rate_pct, "avg_arr_delay_delayed": avg_arr_delay_delayed}
 
+@_memoized
 def monthly_series(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame(columns=["date", "on_time_pct", "cancel_rate_pct"])
-    g = df_filt.groupby(df_filt["date"].dt.to_period("M")).agg(
+    g = df_filt.groupby(month_key(df_filt).rename("date"), observed=True).agg(
         planned=("planned","sum"), canceled=("canceled","sum"),
         circulated=("circulated","sum"), late_arr=("late_arr_count","sum"),
     )
-    g.index = g.index.to_timestamp()
-    g["on_time_pct"] = np.where(g["circulated"]>0,(g["circulated"]-g["late_arr"])/g["circulated"]*100.0,np.nan)
-    g["cancel_rate_pct"] = np.where(g["planned"]>0,g["canceled"]/g["planned"]*100.0,np.nan)
+    circ, late = f64(g["circulated"]), f64(g["late_arr"])
+    g["on_time_pct"] = pct(circ - late, circ)
+    g["cancel_rate_pct"] = pct(f64(g["canceled"]), f64(g["planned"]))
     return g.reset_index()[["date","on_time_pct","cancel_rate_pct"]]
 
+@_memoized
 def duration_small_multiples(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame(columns=["date","duration_class","on_time_pct"])
-    gp = df_filt.groupby([df_filt["date"].dt.to_period("M"), "duration_class"]).agg(
+    gp = df_filt.groupby([month_key(df_filt).rename("date"), "duration_class"], observed=True).agg(
         circulated=("circulated","sum"), late_arr=("late_arr_count","sum"),
     )
-    gp["on_time_pct"] = np.where(gp["circulated"]>0,(gp["circulated"]-gp["late_arr"])/gp["circulated"]*100.0,np.nan)
+    circ, late = f64(gp["circulated"]), f64(gp["late_arr"])
+    gp["on_time_pct"] = pct(circ - late, circ)
     gp = gp.reset_index()
-    gp["date"] = gp["date"].dt.to_timestamp()
     return gp[["date","duration_class","on_time_pct"]]
 
-def liaison_ranking(df_filt: pd.DataFrame, metric: str, treat_bidirectional: bool, top_n: int = 10):
-    if df_filt.empty:
-        return pd.DataFrame(), pd.DataFrame()
-
+@_memoized
+def _liaison_kpis(df_filt: pd.DataFrame, treat_bidirectional: bool) -> pd.DataFrame:
+    # Per-liaison totals and rates, shared by every ranking metric
     if treat_bidirectional:
         df = _normalize_pair_cols(df_filt)
         group_key = "liaison_norm"
     else:
-        df = df_filt.copy()
+        df = df_filt
         group_key = "liaison"
 
-    g = df.groupby(group_key).agg(
+    g = df.groupby(group_key, observed=True, sort=False).agg(
         planned=("planned", "sum"),
         canceled=("canceled", "sum"),
         circulated=("circulated", "sum"),
@@ -105,12 +218,18 @@ def liaison_ranking(df_filt: pd.DataFrame, metric: str, treat_bidirectional: boo
         avg_delay_arr_delayed_min=("avg_delay_arr_delayed_min", "mean"),
     )
 
-    g["on_time_pct"] = np.where(
-        g["circulated"] > 0, (g["circulated"] - g["late_arr"]) / g["circulated"] * 100.0, np.nan
-    )
-    g["cancel_rate_pct"] = np.where(
-        g["planned"] > 0, g["canceled"] / g["planned"] * 100.0, np.nan
-    )
+    circ, late = f64(g["circulated"]), f64(g["late_arr"])
+    g["on_time_pct"] = pct(circ - late, circ)
+    g["cancel_rate_pct"] = pct(f64(g["canceled"]), f64(g["planned"]))
+    g.index.name = "liaison"
+    return g
+
+@_memoized
+def liaison_ranking(df_filt: pd.DataFrame, metric: str, treat_bidirectional: bool, top_n: int = 10):
+    if df_filt.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    g = _liaison_kpis(df_filt, treat_bidirectional)
 
     metric_map = {
         "On-time arrival %": "on_time_pct",
@@ -119,8 +238,6 @@ def liaison_ranking(df_filt: pd.DataFrame, metric: str, treat_bidirectional: boo
     }
     col = metric_map.get(metric, "on_time_pct")
 
-    g.index.name = "liaison"
-
     g = g.sort_values(col, ascending=(col != "on_time_pct"))
     g["rank_metric"] = g[col]
 
@@ -128,45 +245,45 @@ def liaison_ranking(df_filt: pd.DataFrame, metric: str, treat_bidirectional: boo
     bottom = g.tail(top_n).copy()
     return top, bottom
 
+@_memoized
 def delay_distribution(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame()
     return df_filt[["duration_class", "avg_delay_arr_delayed_min"]].dropna()
 
+@_memoized
+def _liaison_volume(df_filt: pd.DataFrame) -> pd.Series:
+    # Circulated trains per liaison, largest first; drives the Top-N cuts on the Causes page
+    group = df_filt["liaison"].rename("group")
+    return df_filt["circulated"].groupby(group, observed=True, sort=False).sum().sort_values(ascending=False)
+
+@_memoized
 def causes_composition(df_filt: pd.DataFrame, breakdown: str, top_n: Optional[int] = None): # Use Optional
     if df_filt.empty:
         return pd.DataFrame(columns=["group", "cause", "pct"])
 
     # weights
-    w = df_filt["late_arr_count"].fillna(0).astype(float)
+    w = f64(df_filt["late_arr_count"], na_value=0.0)
 
     # keep cause columns that exist
-    cause_cols = [c for c in [
-        "pct_cause_external", "pct_cause_infra", "pct_cause_traffic",
-        "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers"
-    ] if c in df_filt.columns]
+    cause_cols = cause_cols_in(df_filt)
 
     if not cause_cols:
         return pd.DataFrame(columns=["group", "cause", "pct"])
 
-    df = df_filt.copy()
-    df["_w"] = w
-
-    # Group key
+    # Group key, passed to groupby as an external Series
     if breakdown == "Month":
-        df["_group"] = df["date"].dt.to_period("M").dt.to_timestamp()
+        group = month_key(df_filt).rename("group")
     else:  
-        df["_group"] = df["liaison"]
+        group = df_filt["liaison"].rename("group")
 
     # Weighted mean per group: sum(pct * w) / sum(w)
-    weighted = df[cause_cols].multiply(df["_w"], axis=0)
-    num = weighted.groupby(df["_group"]).sum()
-    den = df.groupby("_group")["_w"].sum().replace(0, np.nan)
-    comp_wide = num.divide(den, axis=0) 
+    num, den = _weighted_sums(df_filt[cause_cols], w, group)
+    comp_wide = _safe_divide(num, den)
 
     liaison_volume = None
     if breakdown == "Liaison":
-        liaison_volume = df.groupby("_group")["circulated"].sum().sort_values(ascending=False)
+        liaison_volume = _liaison_volume(df_filt)
 
     if breakdown == "Liaison" and top_n is not None and liaison_volume is not None:
         keep = liaison_volume.index[:top_n]
@@ -175,18 +292,10 @@ def causes_composition(df_filt: pd.DataFrame, breakdown: str, top_n: Optional[in
         liaison_volume = liaison_volume.loc[keep]
 
 
-    comp = comp_wide.reset_index().rename(columns={"_group": "group"})
+    comp = comp_wide.reset_index()
     comp = comp.melt(id_vars="group", var_name="cause", value_name="pct")
 
-    label_map = {
-        "pct_cause_external": "External",
-        "pct_cause_infra": "Infrastructure",
-        "pct_cause_traffic": "Traffic management",
-        "pct_cause_rollingstock": "Rolling stock",
-        "pct_cause_station_reuse": "Station ops & reuse",
-        "pct_cause_passengers": "Passengers / PSH / connections",
-    }
-    comp["cause"] = comp["cause"].map(label_map).fillna(comp["cause"])
+    comp["cause"] = comp["cause"].map(COMPOSITION_LABELS).fillna(comp["cause"])
 
     if breakdown == "Liaison" and liaison_volume is not None:
         ordered_liaisons = liaison_volume.index.tolist()
@@ -195,31 +304,30 @@ def causes_composition(df_filt: pd.DataFrame, breakdown: str, top_n: Optional[in
 
     return comp
 
+@_memoized
 def severe_counts(df_filt: pd.DataFrame, breakdown: str, bucket: str, top_n: int | None = None):
     if df_filt.empty:
         return pd.DataFrame(columns=["group", "count"])
 
-    col_map = {"≥15": "late_over_15_count", "≥30": "late_over_30_count", "≥60": "late_over_60_count"}
-    col = col_map.get(bucket) 
+    col = BUCKET_COLS.get(bucket)
 
     # Ensure the target column exists before proceeding
     if not col or col not in df_filt.columns:
         st.warning(f"Column '{col}' for severity bucket '{bucket}' not found in data. Cannot compute severe counts.")
         return pd.DataFrame(columns=["group", "count"])
 
-    df = df_filt.copy()
     if breakdown == "Month":
-        df["_group"] = df["date"].dt.to_period("M").dt.to_timestamp()
+        group = month_key(df_filt).rename("group")
     else: 
-        df["_group"] = df["liaison"]
+        group = df_filt["liaison"].rename("group")
 
     # Perform the aggregation
-    g = df.groupby("_group")[col].sum().reset_index().rename(columns={"_group": "group", col: "count"})
+    g = df_filt[col].groupby(group, observed=True, sort=False).sum().reset_index().rename(columns={col: "count"})
 
     # Filter for Top N 
     if breakdown == "Liaison" and top_n is not None:
-        if "circulated" in df.columns:
-            vol = df.groupby("_group")["circulated"].sum().sort_values(ascending=False)
+        if "circulated" in df_filt.columns:
+            vol = _liaison_volume(df_filt)
             keep = list(vol.index[:top_n])
             g = g[g["group"].isin(keep)]
         else:
@@ -230,6 +338,13 @@ def severe_counts(df_filt: pd.DataFrame, breakdown: str, bucket: str, top_n: int
 
     return g
 
+def _group_mode(df: pd.DataFrame, key: str, col: str) -> pd.Series:
+    # Most frequent value per group; counts come sorted by value, so ties go to the smallest like Series.mode()
+    counts = df.groupby([key, col], observed=True).size().reset_index(name="_n")
+    top = counts.loc[counts.groupby(key, observed=True, sort=False)["_n"].idxmax()]
+    return top.set_index(key)[col].astype(object)
+
+@_memoized
 def liaison_summary(df_filt: pd.DataFrame, treat_bidirectional: bool = False) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame(columns=[
@@ -241,34 +356,23 @@ def liaison_summary(df_filt: pd.DataFrame, treat_bidirectional: bool = False) ->
         df = _normalize_pair_cols(df_filt)
         key = "liaison_norm"
     else:
-        df = df_filt.copy()
+        df = df_filt
         key = "liaison"
 
-    # Helper for mode
-    def _mode(s: pd.Series):
-        return s.mode().iloc[0] if not s.mode().empty else None
-
-    g = df.groupby(key).agg(
+    g = df.groupby(key, observed=True).agg(
         planned=("planned","sum"),
         canceled=("canceled","sum"),
         circulated=("circulated","sum"),
         late_arr_count=("late_arr_count","sum"),
         avg_delay_arr_delayed_min=("avg_delay_arr_delayed_min","mean"),
-        service=("service", _mode),
-        duration_class=("duration_class", _mode),
     )
+    g["service"] = _group_mode(df, key, "service").reindex(g.index)
+    g["duration_class"] = _group_mode(df, key, "duration_class").reindex(g.index)
 
-    g["on_time_pct"] = np.where(
-        g["circulated"] > 0,
-        (g["circulated"] - g["late_arr_count"]) / g["circulated"] * 100.0,
-        np.nan
-    )
-    g["cancel_rate_pct"] = np.where(
-        g["planned"] > 0, g["canceled"] / g["planned"] * 100.0, np.nan
-    )
-    g["late_rate_pct"] = np.where(
-        g["circulated"] > 0, g["late_arr_count"] / g["circulated"] * 100.0, np.nan
-    )
+    circ, late = f64(g["circulated"]), f64(g["late_arr_count"])
+    g["on_time_pct"] = pct(circ - late, circ)
+    g["cancel_rate_pct"] = pct(f64(g["canceled"]), f64(g["planned"]))
+    g["late_rate_pct"] = pct(late, circ)
 
     g.index.name = "liaison"
     g = g.reset_index()
@@ -277,22 +381,7 @@ def liaison_summary(df_filt: pd.DataFrame, treat_bidirectional: bool = False) ->
         "on_time_pct","cancel_rate_pct","late_rate_pct","avg_delay_arr_delayed_min"
     ]]
 
-def _cause_cols_in(df):
-    candidates = [
-        "pct_cause_external", "pct_cause_infra", "pct_cause_traffic",
-        "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers"
-    ]
-    return [c for c in candidates if c in df.columns]
-
-_CAUSE_LABELS = {
-    "pct_cause_external": "External",
-    "pct_cause_infra": "Infrastructure",
-    "pct_cause_traffic": "Traffic",
-    "pct_cause_rollingstock": "Rolling stock",
-    "pct_cause_station_reuse": "Station ops & reuse",
-    "pct_cause_passengers": "Passengers / PSH / connections",
-}
-
+@_memoized
 def causes_pivot_monthly(df_filt: pd.DataFrame) -> pd.DataFrame:
     import numpy as np
     import pandas as pd
@@ -300,29 +389,25 @@ def causes_pivot_monthly(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame()
 
-    cause_cols = _cause_cols_in(df_filt)
+    cause_cols = cause_cols_in(df_filt)
     if not cause_cols:
         return pd.DataFrame()
 
-    df = df_filt.copy()
-    df["_month"] = df["date"].dt.to_period("M").dt.to_timestamp()
-    df["_w"] = df["late_arr_count"].fillna(0).astype(float)
-
-    weighted = df[cause_cols].fillna(0).multiply(df["_w"], axis=0)
-    num = weighted.groupby(df["_month"]).sum()
-    den = df.groupby("_month")["_w"].sum().replace(0, np.nan)
+    month = month_key(df_filt).rename("month")
+    w = f64(df_filt["late_arr_count"], na_value=0.0)
 
-    comp = num.divide(den, axis=0)
+    num, den = _weighted_sums(df_filt[cause_cols], w, month)
+    comp = _safe_divide(num, den)
 
     # Normalize each month to 100%
-    row_sum = comp.sum(axis=1).replace(0, np.nan)
-    comp = comp.divide(row_sum, axis=0).multiply(100)
+    comp = _safe_divide(comp, comp.sum(axis=1)) * 100
 
-    comp = comp.rename(columns=_CAUSE_LABELS)
+    comp = comp.rename(columns=CAUSE_LABELS)
     comp.index.name = "month"
     return comp.reset_index()
 
 
+@_memoized
 def causes_by_attr(df_filt: pd.DataFrame, attr: str) -> pd.DataFrame:
     import numpy as np
     import pandas as pd
@@ -330,128 +415,98 @@ def causes_by_attr(df_filt: pd.DataFrame, attr: str) -> pd.DataFrame:
     if df_filt.empty or attr not in df_filt.columns:
         return pd.DataFrame(columns=["group", "cause", "pct"])
 
-    cause_cols = _cause_cols_in(df_filt)
+    cause_cols = cause_cols_in(df_filt)
     if not cause_cols:
         return pd.DataFrame(columns=["group", "cause", "pct"])
 
-    df = df_filt.copy()
-    df["_w"] = df["late_arr_count"].fillna(0).astype(float)
+    w = f64(df_filt["late_arr_count"], na_value=0.0)
 
-    # Numerators: sum(pct * w) per group for each cause
-    weighted = df[cause_cols].fillna(0).multiply(df["_w"], axis=0)
-    num = weighted.groupby(df[attr]).sum()
-
-    # Denominator: sum(w) per group (avoid /0)
-    den = df.groupby(attr)["_w"].sum().replace(0, np.nan)
+    # Numerators sum(pct * w) and denominator sum(w) per group (avoid /0)
+    num, den = _weighted_sums(df_filt[cause_cols], w, df_filt[attr])
 
     # Weighted mean in %
-    comp = num.divide(den, axis=0)
+    comp = _safe_divide(num, den)
 
-    row_sum = comp.sum(axis=1).replace(0, np.nan)
-    comp = comp.divide(row_sum, axis=0).multiply(100)
+    comp = _safe_divide(comp, comp.sum(axis=1)) * 100
 
     comp = comp.reset_index().rename(columns={attr: "group"})
     comp = comp.melt(id_vars="group", var_name="cause", value_name="pct")
-    comp["cause"] = comp["cause"].map(_CAUSE_LABELS).fillna(comp["cause"])
+    comp["cause"] = comp["cause"].map(CAUSE_LABELS).fillna(comp["cause"])
     comp["pct"] = comp["pct"].fillna(0)
 
     comp["group"] = comp["group"].astype("category")
     return comp
 
+@_memoized
 def severity_profile_by_cause(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame(columns=["cause", "bucket", "pct"])
 
     # Map causes
-    cause_cols = [c for c in [
-        "pct_cause_external", "pct_cause_infra", "pct_cause_traffic",
-        "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers"
-    ] if c in df_filt.columns]
+    cause_cols = cause_cols_in(df_filt)
     if not cause_cols:
         return pd.DataFrame(columns=["cause", "bucket", "pct"])
 
-    label_map = {
-        "pct_cause_external": "External",
-        "pct_cause_infra": "Infrastructure",
-        "pct_cause_traffic": "Traffic",
-        "pct_cause_rollingstock": "Rolling stock",
-        "pct_cause_station_reuse": "Station ops & reuse",
-        "pct_cause_passengers": "Passengers / PSH / connections",
-    }
-
     # Severity buckets
-    candidates = {
-        "≥15": "late_over_15_count",
-        "≥30": "late_over_30_count",
-        "≥60": "late_over_60_count",
-    }
-    buckets = {k: v for k, v in candidates.items() if v in df_filt.columns}
+    buckets = bucket_cols_in(df_filt)
     if not buckets:
         return pd.DataFrame(columns=["cause", "bucket", "pct"])
 
-    df = df_filt.copy()
-    # Weighted contribution of each cause to each bucket:
-    out = []
-    for b_name, b_col in buckets.items():
-        for c in cause_cols:
-            num = (df[c].fillna(0).astype(float) * df[b_col].fillna(0).astype(float)).sum()
-            den = df[b_col].fillna(0).sum()
-            pct = float(num / den * 100.0) if den > 0 else np.nan
-            out.append({"cause": label_map.get(c, c), "bucket": b_name, "pct": round(pct, 1)})
-
-    return pd.DataFrame(out)
-
+    # Weighted contribution of each cause to each bucket: (n_causes, n_buckets) in one matmul
+    causes = df_filt[cause_cols].to_numpy(dtype=np.float64, na_value=0.0)
+    counts = df_filt[list(buckets.values())].to_numpy(dtype=np.float64, na_value=0.0)
+    num = causes.T @ counts
+    den = counts.sum(axis=0)
+    pct = np.divide(num * 100.0, den, out=np.full_like(num, np.nan), where=den > 0)
+
+    # Long format, bucket-major like the chart expects
+    return pd.DataFrame({
+        "cause": np.tile([CAUSE_LABELS.get(c, c) for c in cause_cols], len(buckets)),
+        "bucket": np.repeat(list(buckets.keys()), len(cause_cols)),
+        "pct": np.round(pct.T.ravel(), 1),
+    })
+
+@_memoized
 def liaison_cause_dominance_summary(df_filt: pd.DataFrame, treat_bidirectional: bool = True) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame()
 
     # Direction handling
+    df = df_filt
     if treat_bidirectional and {"departure","arrival"}.issubset(df_filt.columns):
-        dep = df_filt["departure"].astype(str)
-        arr = df_filt["arrival"].astype(str)
-        left_first = (dep <= arr)
-        df = df_filt.copy()
-        df["liaison_key"] = np.where(left_first, dep + " ↔ " + arr, arr + " ↔ " + dep)
+        key = _normalize_pair_cols(df_filt)["liaison_norm"]
+    elif "liaison" in df.columns:
+        key = df["liaison"]
     else:
-        df = df_filt.copy()
-        df["liaison_key"] = df.get("liaison", df["departure"].astype(str) + " → " + df["arrival"].astype(str))
+        key = df["departure"].astype(str) + " → " + df["arrival"].astype(str)
+    key = key.rename("liaison_key")
 
     # KPIs
-    g = df.groupby("liaison_key").agg(
+    g = df.groupby(key, observed=True).agg(
         planned=("planned","sum"),
         canceled=("canceled","sum"),
         circulated=("circulated","sum"),
         late=("late_arr_count","sum"),
         avg_delay_arr_delayed_min=("avg_delay_arr_delayed_min","mean"),
     )
-    g["on_time_pct"] = np.where(g["circulated"]>0,(g["circulated"]-g["late"])/g["circulated"]*100.0,np.nan)
+    circ, late = f64(g["circulated"]), f64(g["late"])
+    g["on_time_pct"] = pct(circ - late, circ)
 
     # Dominant cause
-    cause_cols = [c for c in [
-        "pct_cause_external","pct_cause_infra","pct_cause_traffic",
-        "pct_cause_rollingstock","pct_cause_station_reuse","pct_cause_passengers"
-    ] if c in df.columns]
-    label_map = {
-        "pct_cause_external": "External",
-        "pct_cause_infra": "Infrastructure",
-        "pct_cause_traffic": "Traffic",
-        "pct_cause_rollingstock": "Rolling stock",
-        "pct_cause_station_reuse": "Station ops & reuse",
-        "pct_cause_passengers": "Passengers / PSH / connections",
-    }
+    cause_cols = cause_cols_in(df)
 
     if cause_cols:
         # weighted mean per liaison for each cause
-        w = df["late_arr_count"].fillna(0).astype(float)
+        w = f64(df["late_arr_count"], na_value=0.0)
         w = np.where(np.isfinite(w), w, 0.0)
-        wm = {}
-        for c in cause_cols:
-            val = (df[c].fillna(0).astype(float) * w).groupby(df["liaison_key"]).sum()
-            den = pd.Series(w, index=df.index).groupby(df["liaison_key"]).sum().replace(0, np.nan)
-            wm[c] = (val / den) * 100.0
-        wm_df = pd.DataFrame(wm)
-        dom = wm_df.idxmax(axis=1).map(label_map)
-        g["dominant_cause"] = dom
+        # Integer group ids, then per-group sums; argmax of the numerators picks the dominant cause
+        codes, uniques = pd.factorize(key)
+        valid = codes >= 0
+        values = df[cause_cols].to_numpy(dtype=np.float64, na_value=0.0)[valid]
+        num, den = _group_sums(values, w[valid], codes[valid], len(uniques))
+        labels = np.array([CAUSE_LABELS.get(c, c) for c in cause_cols], dtype=object)
+        dom = np.where(den > 0, labels[num.argmax(axis=1)], np.nan)
+        g["dominant_cause"] = pd.Series(dom, index=pd.Index(uniques))
 
     g = g.reset_index().rename(columns={"liaison_key":"liaison","late":"late_arr_count"})
     return g[["liaison","on_time_pct","avg_delay_arr_delayed_min","late_arr_count","dominant_cause"]]
\ No newline at end of file
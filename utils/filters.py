@@ -1,43 +1,72 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
-import bisect
+from functools import lru_cache
 
-def _date_opts():
-    cat = st.session_state.get("filters_catalog", {})
+from utils.prep import filter_values, month_grid
+
+DEFAULT_SERVICES = ["National", "International"]
+DEFAULT_DURATION_CLASSES = ["< 1h30", "1h30–3h", "> 3h"]
+
+# The loaded frame is skipped from hashing (leading underscore); data_version identifies it across sessions
+@st.cache_data(show_spinner=False, max_entries=4)
+def filter_catalog(_df: pd.DataFrame, data_version: str) -> dict:
+    return filter_values(_df)
+
+def _catalog() -> dict:
+    # Read once per sidebar and passed to the accessors below
+    return st.session_state.get("filters_catalog", {})
+
+def _date_opts(cat: dict):
     return cat.get("date_options", [])
 
-def _services():
-    return st.session_state.get("filters_catalog", {}).get("services", ["National", "International"])
+def _services(cat: dict):
+    return cat.get("services", DEFAULT_SERVICES)
+
+def _departures(cat: dict):
+    return cat.get("departures", [])
 
-def _departures():
-    return st.session_state.get("filters_catalog", {}).get("departures", [])
+def _arrivals(cat: dict):
+    return cat.get("arrivals", [])
 
-def _arrivals():
-    return st.session_state.get("filters_catalog", {}).get("arrivals", [])
+def _duration_classes(cat: dict):
+    return cat.get("duration_classes", DEFAULT_DURATION_CLASSES)
 
-def _duration_classes():
-    return st.session_state.get("filters_catalog", {}).get("duration_classes", ["< 1h30", "1h30–3h", "> 3h"])
+@lru_cache(maxsize=8)
+def _parse_months(months_str: tuple) -> tuple:
+    # Fallback for catalogs built without a precomputed date_grid
+    return month_grid(months_str)
 
-def _date_range_slider(label: str):
-    months_str = _date_opts()
+def _date_range_slider(label: str, cat: dict):
+    months_str = _date_opts(cat)
     if not months_str:
         st.sidebar.text_input("Start month (YYYY-MM)", key="date_start")
         st.sidebar.text_input("End month (YYYY-MM)", key="date_end")
         return
 
-    months_dt = [pd.to_datetime(m, format="%Y-%m").date() for m in months_str] # Use %Y-%m
+    grid = cat.get("date_grid") or _parse_months(tuple(months_str))
+    months_np, months_dt, first_ord, contiguous, s2d, d2s = grid
 
-    min_date = months_dt[0]
-    max_date = months_dt[-1]
+    min_date = months_np[0].item()
+    max_date = months_np[-1].item()
 
     # Snap a date to the nearest available month start
     def snap_to_month(d: date) -> date:
-        i = bisect.bisect_left(months_dt, d)
-        if i <= 0: return months_dt[0]
-        if i >= len(months_dt): return months_dt[-1]
-        before, after = months_dt[i - 1], months_dt[i]
-        return before if abs(d - before) <= abs(after - d) else after
+        if contiguous:
+            # Nearest of this month's start and the next one, then a clamped index into the grid
+            start = date(d.year, d.month, 1)
+            nxt = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+            i = (d.year - 1970) * 12 + d.month - 1 - first_ord
+            if (d - start) > (nxt - d):
+                i += 1
+            return months_dt[min(max(i, 0), len(months_dt) - 1)]
+        t = np.datetime64(d, "D")
+        i = int(np.searchsorted(months_np, t))
+        if i <= 0: return min_date
+        if i >= len(months_np): return max_date
+        before, after = months_np[i - 1], months_np[i]
+        return (before if (t - before) <= (after - t) else after).item()
 
     # Define a unique key for the slider widget
     slider_key = "_date_range_slider_internal_value"
@@ -46,16 +75,19 @@ def _date_range_slider(label: str):
     if slider_key not in st.session_state:
         start_s = st.session_state.get("date_start", months_str[0])
         end_s = st.session_state.get("date_end", months_str[-1])
-        try:
-            initial_start_dt = pd.to_datetime(start_s, format="%Y-%m").date()
-            if initial_start_dt not in months_dt: initial_start_dt = snap_to_month(initial_start_dt)
-        except ValueError:
-            initial_start_dt = min_date
-        try:
-            initial_end_dt = pd.to_datetime(end_s, format="%Y-%m").date()
-            if initial_end_dt not in months_dt: initial_end_dt = snap_to_month(initial_end_dt)
-        except ValueError:
-            initial_end_dt = max_date
+        initial_start_dt = s2d.get(start_s)
+        initial_end_dt = s2d.get(end_s)
+        # Months outside the catalog are parsed and snapped
+        if initial_start_dt is None:
+            try:
+                initial_start_dt = snap_to_month(pd.to_datetime(start_s, format="%Y-%m").date())
+            except ValueError:
+                initial_start_dt = min_date
+        if initial_end_dt is None:
+            try:
+                initial_end_dt = snap_to_month(pd.to_datetime(end_s, format="%Y-%m").date())
+            except ValueError:
+                initial_end_dt = max_date
 
         # Ensure start <= end
         if initial_start_dt > initial_end_dt:
@@ -77,56 +109,65 @@ def _date_range_slider(label: str):
     current_value_dt = st.session_state.get(slider_key, (min_date, max_date))
 
     if current_value_dt and len(current_value_dt) == 2:
-        snapped_start_dt = snap_to_month(current_value_dt[0])
-        snapped_end_dt = snap_to_month(current_value_dt[1])
-
         current_start_s = st.session_state.get("date_start")
         current_end_s = st.session_state.get("date_end")
-        new_start_s = pd.to_datetime(snapped_start_dt).strftime("%Y-%m")
-        new_end_s = pd.to_datetime(snapped_end_dt).strftime("%Y-%m")
+
+        # Reruns from other widgets leave the slider and the stored months as they were: nothing to snap
+        last = st.session_state.get("_last_slider_raw")
+        if last == (tuple(current_value_dt), current_start_s, current_end_s):
+            return
+
+        snapped_start_dt = snap_to_month(current_value_dt[0])
+        snapped_end_dt = snap_to_month(current_value_dt[1])
+        new_start_s = d2s[snapped_start_dt]
+        new_end_s = d2s[snapped_end_dt]
 
         if current_start_s != new_start_s or current_end_s != new_end_s:
             st.session_state["date_start"] = new_start_s
             st.session_state["date_end"] = new_end_s
+        st.session_state["_last_slider_raw"] = (tuple(current_value_dt), new_start_s, new_end_s)
     else:
-        st.session_state["date_start"] = pd.to_datetime(min_date).strftime("%Y-%m")
-        st.session_state["date_end"] = pd.to_datetime(max_date).strftime("%Y-%m")
-
-def _stateful_multiselect_service(label: str):
-    options = _services()
-
-    if "service" in st.session_state:
-        current = [v for v in st.session_state["service"] if v in options]
-        if not current:
-            current = list(options)
-        st.session_state["service"] = current
-    else:
-        st.session_state["service"] = list(options)
+        st.session_state["date_start"] = months_str[0]
+        st.session_state["date_end"] = months_str[-1]
+
+def _stateful_multiselect(label: str, key: str, options: list, placeholder: str, opt_set=None):
+    # Keep only still-valid selections (set lookup); an empty or missing selection means "all"
+    if opt_set is None:
+        opt_set = set(options)
+    current = st.session_state.get(key)
+    new = [v for v in current if v in opt_set] if current else []
+    if not new:
+        new = list(options)
+    # Always written back: the assignment is what keeps this widget-owned key alive across page switches
+    st.session_state[key] = new
 
     st.sidebar.multiselect(
         label,
         options=options,
-        key="service",
-        placeholder="Choose services",
+        key=key,
+        placeholder=placeholder,
     )
 
-def _stateful_multiselect_duration(label: str):
-    options = _duration_classes()
-
-    if "duration_class" in st.session_state:
-        current = [v for v in st.session_state["duration_class"] if v in options]
-        if not current:
-            current = list(options)
-        st.session_state["duration_class"] = current
-    else:
-        st.session_state["duration_class"] = list(options)
-
-    st.sidebar.multiselect(
-        label,
-        options=options,
-        key="duration_class",
-        placeholder="Choose duration classes",
-    )
+STATION_SEARCH_THRESHOLD = 200
+STATION_SEARCH_LIMIT = 200
+
+@lru_cache(maxsize=8)
+def _station_index(stations: tuple) -> tuple:
+    # Upper-cased names for case-insensitive search, built once per catalog
+    return tuple(s.upper() for s in stations)
+
+def _station_multiselect(label: str, key: str, options: list, placeholder: str):
+    # Long catalogs are narrowed by a search box first so the multiselect only renders a bounded list;
+    # the query lives in the <key>_query state default (utils.state)
+    if len(options) > STATION_SEARCH_THRESHOLD:
+        q = st.sidebar.text_input(f"Search {label.lower()}", key=f"{key}_query", placeholder="Type part of a name")
+        q = q.strip().upper()
+        selected = set(st.session_state.get(key) or [])
+        upper = _station_index(tuple(options))
+        matches = [o for o, u in zip(options, upper) if q in u][:STATION_SEARCH_LIMIT] if q else options[:STATION_SEARCH_LIMIT]
+        keep = selected | set(matches)
+        options = [o for o in options if o in keep]
+    st.sidebar.multiselect(label, options=options, key=key, placeholder=placeholder)
 
 def _stateful_select_metric(label: str):
     options = [
@@ -167,19 +208,21 @@ def _stateful_select_color_by(label: str):
     st.session_state["color_by"] = map_to_col[st.session_state["color_by_choice"]]
 
 def overview_sidebar():
+    cat = _catalog()
     st.sidebar.header("Overview Filters")
-    _date_range_slider("Date range")
-    _stateful_multiselect_service("Service")
-    _stateful_multiselect_duration("Duration class")
+    _date_range_slider("Date range", cat)
+    _stateful_multiselect("Service", "service", _services(cat), "Choose services", cat.get("services_set"))
+    _stateful_multiselect("Duration class", "duration_class", _duration_classes(cat), "Choose duration classes", cat.get("duration_classes_set"))
     _stateful_select_metric("Primary metric")
 
 def routes_sidebar():
+    cat = _catalog()
     st.sidebar.header("Routes Filters")
-    _date_range_slider("Date range")
-    _stateful_multiselect_service("Service")
+    _date_range_slider("Date range", cat)
+    _stateful_multiselect("Service", "service", _services(cat), "Choose services", cat.get("services_set"))
     st.sidebar.checkbox("Treat A→B and B→A as the same liaison", key="treat_bidirectional")
-    st.sidebar.multiselect("Departure station", options=_departures(), key="departures")
-    st.sidebar.multiselect("Arrival station", options=_arrivals(), key="arrivals")
+    _station_multiselect("Departure station", "departures", _departures(cat), "Choose departure stations")
+    _station_multiselect("Arrival station", "arrivals", _arrivals(cat), "Choose arrival stations")
     st.sidebar.selectbox(
         "Ranking metric",
         options=["On-time arrival %", "Avg arrival delay (delayed trains)", "Cancel rate %"],
@@ -188,10 +231,11 @@ def routes_sidebar():
     _stateful_select_color_by("Color by")
 
 def causes_sidebar():
+    cat = _catalog()
     st.sidebar.header("Causes & Severity Filters")
-    _date_range_slider("Date range")
-    _stateful_multiselect_service("Service")
-    _stateful_multiselect_duration("Duration class")  
+    _date_range_slider("Date range", cat)
+    _stateful_multiselect("Service", "service", _services(cat), "Choose services", cat.get("services_set"))
+    _stateful_multiselect("Duration class", "duration_class", _duration_classes(cat), "Choose duration classes", cat.get("duration_classes_set"))  
 
     st.sidebar.selectbox("Breakdown", options=["Month", "Liaison"], key="causes_breakdown")
 
@@ -201,16 +245,18 @@ def causes_sidebar():
     st.sidebar.selectbox("Severity bucket", options=["≥15", "≥30", "≥60"], index=0, key="severity_bucket")
 
 def geo_sidebar():
+    cat = _catalog()
     st.sidebar.header("Geo View Filters")
-    _date_range_slider("Date range")
-    _stateful_multiselect_service("Service")
+    _date_range_slider("Date range", cat)
+    _stateful_multiselect("Service", "service", _services(cat), "Choose services", cat.get("services_set"))
     st.sidebar.checkbox("Treat A→B and B→A as the same liaison", key="treat_bidirectional")
-    st.sidebar.multiselect("Departure station", options=_departures(), key="departures")
-    st.sidebar.multiselect("Arrival station", options=_arrivals(), key="arrivals")
+    _station_multiselect("Departure station", "departures", _departures(cat), "Choose departure stations")
+    _station_multiselect("Arrival station", "arrivals", _arrivals(cat), "Choose arrival stations")
 
 def dq_sidebar():
+    cat = _catalog()
     st.sidebar.header("Data Quality Tools")
-    _date_range_slider("Date range")
+    _date_range_slider("Date range", cat)
 
 def conclusions_sidebar():
     pass
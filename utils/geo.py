@@ -1,20 +1,51 @@
+import streamlit as st
 import pandas as pd
 import numpy as np
-import unicodedata
+import pyarrow as pa
+from pathlib import Path
+
+from utils.compute import _memoized, restamp
+from utils.prep import frame_digest, to_categorical
+
+def _norm_series(s: pd.Series) -> pd.Series:
+    # Accent-free, upper-case, single-spaced station keys; Arrow-backed strings so the string ops run as
+    # pyarrow kernels (RE2 regex, hence \p{Mn} for combining marks)
+    return (
+        s.astype("string[pyarrow]").str.strip()
+        .str.normalize("NFD").str.replace(r"\p{Mn}", "", regex=True)
+        .str.replace("-", " ", regex=False).str.replace("’", "'", regex=False)
+        .str.upper().str.split().str.join(" ")
+        .fillna("").astype(object)
+    )
 
-def _norm_name(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s).strip()
-    s = "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-    s = s.replace("-", " ").replace("’", "'")
-    return " ".join(s.upper().split())
+def _key_codes(s: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Distinct names, their normalized keys with "" appended for missing names, and each row's code (-1 = missing)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        uniques, codes = s.cat.categories, s.cat.codes.to_numpy()
+    else:
+        codes, uniques = pd.factorize(s)
+    names = np.asarray(uniques, dtype=object)
+    keys = _norm_series(pd.Series(names, dtype=object)).to_numpy(dtype=object)
+    return names, np.append(keys, ""), codes
 
 def load_station_lookup(path: str = "data/stations.csv") -> pd.DataFrame:
-    try:
-        df = pd.read_csv(path)
-    except FileNotFoundError:
+    p = Path(path)
+    if not p.exists():
         return pd.DataFrame(columns=["station", "lat", "lon", "key"])
+    # Keyed on the CSV's mtime so edits to the station list are picked up
+    return _station_lookup(str(p), p.stat().st_mtime)
+
+@st.cache_data(show_spinner=False)
+def _station_lookup(path: str, mtime: float) -> pd.DataFrame:
+    # Normalized keys are cached next to the CSV; the Parquet copy is used while it is newer than the CSV
+    pq = Path(path).with_suffix(".parquet")
+    if pq.exists() and pq.stat().st_mtime >= mtime:
+        try:
+            return pd.read_parquet(pq)
+        except (OSError, ImportError, pa.ArrowException) as e:
+            st.warning(f"Could not load station cache ({pq.name}): {e}. Rebuilding it from the CSV.")
+
+    df = pd.read_csv(path)
     cols = {c.lower(): c for c in df.columns}
     need = {"station", "lat", "lon"}
     if not need.issubset(set(cols.keys()) | set(df.columns.str.lower())):
@@ -22,38 +53,54 @@ def load_station_lookup(path: str = "data/stations.csv") -> pd.DataFrame:
     df = df.rename(columns={cols.get("station", "station"): "station",
                             cols.get("lat", "lat"): "lat",
                             cols.get("lon", "lon"): "lon"})
-    df["key"] = df["station"].map(_norm_name)
-    return df[["station", "lat", "lon", "key"]]
+    df["key"] = _norm_series(df["station"])
+    df = df[["station", "lat", "lon", "key"]]
+
+    try:
+        df.to_parquet(pq, index=False)
+    except (OSError, ImportError, pa.ArrowException) as e:
+        st.warning(f"Could not save station cache ({pq.name}): {e}")
+    return df
 
 def attach_coords(df: pd.DataFrame, lut: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     if df.empty or lut.empty:
         return df.assign(dep_lat=np.nan, dep_lon=np.nan, arr_lat=np.nan, arr_lon=np.nan), []
 
-    d = df.copy()
-    d["dep_key"] = d["departure"].map(_norm_name)
-    d["arr_key"] = d["arrival"].map(_norm_name)
-
-    lut_dep = lut[["key", "lat", "lon"]].rename(columns={"lat": "dep_lat", "lon": "dep_lon"})
-    lut_arr = lut[["key", "lat", "lon"]].rename(columns={"lat": "arr_lat", "lon": "arr_lon"})
-
-    d = d.merge(lut_dep, left_on="dep_key", right_on="key", how="left").drop(columns=["key"])
-    d = d.merge(lut_arr, left_on="arr_key", right_on="key", how="left").drop(columns=["key"])
+    # Normalize and look up each distinct station once, then broadcast to rows by code
+    lat_map = dict(zip(lut["key"], lut["lat"]))
+    lon_map = dict(zip(lut["key"], lut["lon"]))
+    keys, coords, missing = {}, {}, set()
+    for side, col in (("dep", "departure"), ("arr", "arrival")):
+        names, uniq, codes = _key_codes(df[col])
+        lat = pd.Series(uniq).map(lat_map).to_numpy(dtype=np.float64)
+        lon = pd.Series(uniq).map(lon_map).to_numpy(dtype=np.float64)
+        keys[f"{side}_key"] = uniq[codes]
+        coords[f"{side}_lat"] = lat[codes]
+        coords[f"{side}_lon"] = lon[codes]
+        # Stations present in df without coordinates, read off the per-name arrays
+        seen = np.zeros(len(uniq), dtype=bool)
+        seen[codes] = True
+        unmatched = seen[:-1] & np.isnan(lat[:-1])
+        missing.update(m for m in names[unmatched] if isinstance(m, str))
+    d = df.assign(**keys, **coords)
+
+    # Station table fingerprint, so views memoized on d are keyed on both filters and coordinates
+    lut_version = frame_digest(lut[["key", "lat", "lon"]])
+    d = restamp(d, df, "coords", lut_version)
 
-    missing = set()
-    missing.update(d.loc[d["dep_lat"].isna(), "departure"].unique().tolist())
-    missing.update(d.loc[d["arr_lat"].isna(), "arrival"].unique().tolist())
-    missing = [m for m in missing if isinstance(m, str)]
     return d, sorted(missing)
 
+@_memoized
 def build_edges(df_filt: pd.DataFrame) -> pd.DataFrame:
     if df_filt.empty:
         return pd.DataFrame(columns=[
             "liaison", "dep_lon", "dep_lat", "arr_lon", "arr_lat",
             "on_time_pct", "cancel_rate_pct", "severe_15_count", "circulated",
-            "color", "width"
+            "color_r", "color_g", "color_b", "color_a", "width"
         ])
 
-    grp = df_filt.groupby("liaison", as_index=False).agg(
+    # Group on integer codes; a no-op for the loaded frame, which is already categorical
+    grp = to_categorical(df_filt).groupby("liaison", as_index=False, observed=True).agg(
         planned=("planned", "sum"),
         canceled=("canceled", "sum"),
         circulated=("circulated", "sum"),
@@ -73,17 +120,20 @@ def build_edges(df_filt: pd.DataFrame) -> pd.DataFrame:
     # Drop rows without coordinates
     grp = grp.dropna(subset=["dep_lat", "dep_lon", "arr_lat", "arr_lon"])
 
-    # Edge styling
-    def pct_to_rgba(p):
-        if pd.isna(p):  # gray fallback
-            return [150, 150, 150, 180]
-        p = max(0, min(100, float(p)))
-        r = int(round(255 * (100 - p) / 100))
-        g = int(round(180 + (75 * p / 100)))
-        b = int(round(80 * (100 - p) / 100))
-        return [r, g, b, 180]
-
-    grp["color"] = grp["on_time_pct"].map(pct_to_rgba)
+    # Edge styling: red→green by on-time %, gray when unknown
+    p = grp["on_time_pct"].to_numpy(dtype=np.float64, na_value=np.nan)
+    pc = np.clip(p, 0, 100)
+    rgba = np.column_stack([
+        np.rint(255 * (100 - pc) / 100),
+        np.rint(180 + (75 * pc / 100)),
+        np.rint(80 * (100 - pc) / 100),
+        np.full(len(pc), 180.0),
+    ])
+    rgba[np.isnan(p)] = [150, 150, 150, 180]
+    # One uint8 column per channel; a layer can read them as get_color="[color_r, color_g, color_b, color_a]"
+    rgba = rgba.astype(np.uint8)
+    for i, ch in enumerate("rgba"):
+        grp[f"color_{ch}"] = rgba[:, i]
 
     # Width scaling
     if len(grp) > 0 and grp["circulated"].max() > 0:
@@ -96,70 +146,65 @@ def build_edges(df_filt: pd.DataFrame) -> pd.DataFrame:
         "liaison", "dep_lon", "dep_lat", "arr_lon", "arr_lat",
         "on_time_pct", "cancel_rate_pct", "severe_15_count", "circulated",
         "avg_delay_arr_delayed_min",
-        "color", "width"
+        "color_r", "color_g", "color_b", "color_a", "width"
     ]]
 
-import numpy as np
-from math import radians, sin, cos, asin, sqrt
-
 def add_edge_distance_km(edges: pd.DataFrame) -> pd.DataFrame:
     if edges is None or edges.empty:
         return edges
-    e = edges.copy()
-
-    # Prepare arrays
-    lat1 = e["dep_lat"].astype(float)
-    lon1 = e["dep_lon"].astype(float)
-    lat2 = e["arr_lat"].astype(float)
-    lon2 = e["arr_lon"].astype(float)
-
-    valid = lat1.notna() & lon1.notna() & lat2.notna() & lon2.notna()
-    dist = np.full(len(e), np.nan, dtype=float)
-    if valid.any():
-        r = 6371.0088
-        φ1 = np.radians(lat1[valid])
-        φ2 = np.radians(lat2[valid])
-        Δφ = np.radians((lat2 - lat1)[valid])
-        Δλ = np.radians((lon2 - lon1)[valid])
-
-        a = np.sin(Δφ/2.0)**2 + np.cos(φ1) * np.cos(φ2) * np.sin(Δλ/2.0)**2
-        dist_valid = 2.0 * r * np.arcsin(np.sqrt(a))
-        dist[valid.to_numpy()] = dist_valid
-
-    e["distance_km"] = dist
-    return e
 
+    # Haversine over whole columns; NaN coordinates propagate to a NaN distance
+    lat1, lon1, lat2, lon2 = (
+        edges[c].to_numpy(dtype=np.float64, na_value=np.nan) for c in ["dep_lat", "dep_lon", "arr_lat", "arr_lon"]
+    )
+    r = 6371.0088
+    # A few work buffers updated in place instead of a fresh temporary per ufunc (the inputs may be views of edges)
+    a = np.radians(lat2 - lat1)
+    b = np.radians(lon2 - lon1)
+    c = np.cos(np.radians(lat1))
+    t = np.radians(lat2)
+    c *= np.cos(t, out=t)
+
+    # a = sin²(Δφ/2) + cos φ1 · cos φ2 · sin²(Δλ/2)
+    a *= 0.5
+    np.square(np.sin(a, out=a), out=a)
+    b *= 0.5
+    np.square(np.sin(b, out=b), out=b)
+    c *= b
+    a += c
+    np.arcsin(np.sqrt(a, out=a), out=a)
+    a *= 2.0 * r
+    return edges.assign(distance_km=a)
+
+@_memoized
 def station_metrics(df_with_coords: pd.DataFrame) -> pd.DataFrame:
     if df_with_coords is None or df_with_coords.empty:
         return pd.DataFrame(columns=["station","lat","lon","circulated","late_arr_count",
                                      "on_time_pct","late_rate_pct"])
 
-    # Build long format for dep & arr
-    dep = df_with_coords.rename(columns={"departure":"station","dep_lat":"lat","dep_lon":"lon"}).copy()
-    arr = df_with_coords.rename(columns={"arrival":"station","arr_lat":"lat","arr_lon":"lon"}).copy()
-    keep = ["station","lat","lon","circulated","late_arr_count"]
-    dep = dep[keep]
-    arr = arr[keep]
-    long = pd.concat([dep, arr], axis=0, ignore_index=True)
-    long = long.dropna(subset=["lat","lon"])
-
-    g = long.groupby(["station","lat","lon"]).agg(
-        circulated=("circulated","sum"),
-        late_arr_count=("late_arr_count","sum"),
-    ).reset_index()
+    # Aggregate each endpoint separately and add the partial sums (no stacked 2N-row frame)
+    names = ["station","lat","lon"]
+    cols = ["circulated","late_arr_count"]
+    df_with_coords = to_categorical(df_with_coords)
+    parts = []
+    for keys in (["departure","dep_lat","dep_lon"], ["arrival","arr_lat","arr_lon"]):
+        part = df_with_coords.groupby(keys, observed=True)[cols].sum()
+        part.index.names = names
+        parts.append(part)
+    g = parts[0].add(parts[1], fill_value=0).reset_index()
+
     g["late_rate_pct"] = np.where(g["circulated"]>0, g["late_arr_count"]/g["circulated"]*100.0, np.nan)
     g["on_time_pct"] = 100.0 - g["late_rate_pct"]
     return g
 
+@_memoized
 def late_points_for_density(df_with_coords: pd.DataFrame) -> pd.DataFrame:
     if df_with_coords is None or df_with_coords.empty:
         return pd.DataFrame(columns=["lat","lon","weight"])
-    dep = df_with_coords[["dep_lat","dep_lon","late_arr_count"]].rename(
-        columns={"dep_lat":"lat","dep_lon":"lon","late_arr_count":"weight"}
-    )
-    arr = df_with_coords[["arr_lat","arr_lon","late_arr_count"]].rename(
-        columns={"arr_lat":"lat","arr_lon":"lon","late_arr_count":"weight"}
-    )
-    pts = pd.concat([dep, arr], axis=0, ignore_index=True).dropna(subset=["lat","lon"])
-    pts["weight"] = pts["weight"].fillna(0).astype(float)
-    return pts
\ No newline at end of file
+    # Departure points then arrival points, stacked as plain arrays
+    d = df_with_coords
+    lat = np.concatenate([d["dep_lat"].to_numpy(dtype=np.float64), d["arr_lat"].to_numpy(dtype=np.float64)])
+    lon = np.concatenate([d["dep_lon"].to_numpy(dtype=np.float64), d["arr_lon"].to_numpy(dtype=np.float64)])
+    w = d["late_arr_count"].to_numpy(dtype=np.float64, na_value=0.0)
+    keep = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    return pd.DataFrame({"lat": lat[keep], "lon": lon[keep], "weight": np.tile(w, 2)[keep]}, index=keep)
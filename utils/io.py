@@ -2,12 +2,41 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 
+from utils.prep import clean, prepare
+
+CSV_STR_DTYPES = {
+    "Date": "object",
+    "Service": "object",
+    "Gare de départ": "object",
+    "Gare d'arrivée": "object",
+}
+
 @st.cache_data(show_spinner=False)
 def load_csv_semicolon(path: str | Path) -> pd.DataFrame:
+    return _read_csv_semicolon(path)
+
+def load_clean_csv(path: str | Path) -> pd.DataFrame:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Data file not found: {p.resolve()}")
+    # Keyed on path + mtime instead of hashing the raw frame; a re-downloaded CSV is cleaned again
+    return _load_clean_csv(str(p), p.stat().st_mtime)
+
+@st.cache_data(show_spinner=False)
+def _load_clean_csv(path: str, mtime: float) -> pd.DataFrame:
+    # Read, clean and lay out once per file version; new sessions reuse the result (the raw frame is not kept)
+    return prepare(clean(_read_csv_semicolon(path)))
+
+def _read_csv_semicolon(path: str | Path) -> pd.DataFrame:
     path = Path(path)
     if not path.exists():
         raise FileNotFoundError(f"Data file not found: {path.resolve()}")
-    df = pd.read_csv(path, sep=";", encoding="utf-8", low_memory=False)
+    try:
+        # Arrow's multithreaded parser; key columns stay strings whatever they look like
+        df = pd.read_csv(path, sep=";", encoding="utf-8", engine="pyarrow", dtype=CSV_STR_DTYPES)
+    except (ImportError, ValueError):
+        # No pyarrow, or rows it rejects (e.g. ragged lines): the C parser is more lenient
+        df = pd.read_csv(path, sep=";", encoding="utf-8", low_memory=False)
     return df
 
 @st.cache_data(show_spinner=False)
@@ -21,5 +50,6 @@ def maybe_read_parquet(path: str | Path) -> pd.DataFrame | None:
 def write_parquet(df: pd.DataFrame, path: str | Path) -> str:
     p = Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(p, index=False)
+    # Categoricals are written dictionary-encoded; zstd keeps the repeated numeric columns small too
+    df.to_parquet(p, index=False, engine="pyarrow", compression="zstd", row_group_size=200_000)
     return str(p.resolve())
\ No newline at end of file
@@ -1,6 +1,9 @@
+import hashlib
 import pandas as pd
 import numpy as np
 
+from utils.schema import cause_cols_in
+
 FR_TO_EN = {
     "Date": "date",
     "Service": "service",
@@ -44,83 +47,213 @@ NUMERIC_FLOAT = [
     "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers",
 ]
 
-def _coerce_int(s: pd.Series) -> pd.Series:
-    return pd.to_numeric(s, errors="coerce").astype("Int64")
+CATEGORICAL = ["service", "departure", "arrival", "liaison", "duration_class"]
+
+COMMENT_COLS = ["cancel_comment", "dep_delay_comment", "arr_delay_comment"]
+
+# Category order as astype("category") gives (name order); codes index into it
+DURATION_CATEGORIES = ["1h30–3h", "< 1h30", "> 3h", "unknown"]
 
-def _coerce_float(s: pd.Series) -> pd.Series:
-    return pd.to_numeric(s, errors="coerce").astype(float)
+def _duration_class(mins: pd.Series) -> pd.Series:
+    # < 90 | 90..180 inclusive | > 180 | missing, as int8 codes from two comparisons; no Python-level strings per row
+    v = mins.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes = np.full(len(v), 2, dtype=np.int8)
+    codes[v <= 180] = 0
+    codes[v < 90] = 1
+    codes[np.isnan(v)] = 3
+    cls = pd.Categorical.from_codes(codes, categories=DURATION_CATEGORIES)
+    return pd.Series(cls, index=mins.index).cat.remove_unused_categories()
 
-def _duration_class(mins: float | int) -> str:
-    if pd.isna(mins):
-        return "unknown"
-    if mins < 90:
-        return "< 1h30"
-    if mins <= 180:
-        return "1h30–3h"
-    return "> 3h"
+def _liaison(dep: pd.Series, arr: pd.Series, sep: str = " → ") -> pd.Series:
+    # "dep → arr" labels built once per distinct station pair from the shared station codes (no per-row strings)
+    cats = np.append(dep.cat.categories.to_numpy(dtype=object), "nan")
+    n = len(cats)
+    pair = (dep.cat.codes.to_numpy(dtype=np.int64) % n) * n + arr.cat.codes.to_numpy(dtype=np.int64) % n
+    codes, uniq = pd.factorize(pair)
+    labels = pd.Categorical(cats[uniq // n] + sep + cats[uniq % n])
+    return pd.Series(pd.Categorical.from_codes(labels.codes[codes], dtype=labels.dtype), index=dep.index)
 
 def clean(df_raw: pd.DataFrame) -> pd.DataFrame:
     # Rename columns
     df = df_raw.rename(columns=FR_TO_EN).copy()
 
     # Parse date as first day of month
-    df["date"] = pd.to_datetime(df["date"], format="%Y-%m")
+    # Each month string repeats once per route; cache=True parses the distinct ones once
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m", cache=True)
 
-    # Coerce numeric columns
-    for col in NUMERIC_INT:
-        if col in df.columns:
-            df[col] = _coerce_int(df[col])
-    for col in NUMERIC_FLOAT:
-        if col in df.columns:
-            df[col] = _coerce_float(df[col])
+    # Coerce numeric columns: only those the parser left as text go through to_numeric, then one astype for all
+    ints = [c for c in NUMERIC_INT if c in df.columns]
+    floats = [c for c in NUMERIC_FLOAT if c in df.columns]
+    parsed = {
+        c: pd.to_numeric(df[c], errors="coerce") for c in ints + floats
+        if not pd.api.types.is_numeric_dtype(df[c])
+    }
+    df = df.assign(**parsed).astype({**dict.fromkeys(ints, "Int64"), **dict.fromkeys(floats, "float64")})
+
+    # String keys as categoricals (stations share one sorted dtype), free text as Arrow strings
+    df = comment_strings(to_categorical(df))
 
     # Derived fields
-    df["liaison"] = df["departure"].astype(str) + " → " + df["arrival"].astype(str)
-    df["duration_class"] = df["avg_duration_min"].apply(_duration_class)
+    df["liaison"] = _liaison(df["departure"], df["arrival"])
+    df["duration_class"] = _duration_class(df["avg_duration_min"])
 
     # Circulated = planned - canceled (>= 0)
     df["circulated"] = (df["planned"].fillna(0) - df["canceled"].fillna(0)).clip(lower=0).astype("Int64")
 
-    # Cancel rate (% of planned)
-    with np.errstate(divide="ignore", invalid="ignore"):
-        df["cancel_rate_pct"] = np.where(
-            df["planned"] > 0,
-            100 * df["canceled"].fillna(0) / df["planned"],
-            np.nan
-        )
+    # Cancel rate (% of planned): missing cancellations count as 0, NaN where planned is missing or 0
+    planned = df["planned"].to_numpy(dtype=np.float64, na_value=np.nan)
+    canceled = df["canceled"].to_numpy(dtype=np.float64, na_value=0.0)
+    df["cancel_rate_pct"] = np.divide(100 * canceled, planned, out=np.full(len(df), np.nan), where=planned > 0)
 
     # Sanity checks flags
-    df["check_late_chain_ok"] = (
-        (df["late_over_60_count"].fillna(0) <= df["late_over_30_count"].fillna(0)) &
-        (df["late_over_30_count"].fillna(0) <= df["late_over_15_count"].fillna(0)) &
-        (df["late_over_15_count"].fillna(0) <= df["circulated"].fillna(0))
+    # Missing counts read as 0; compared as plain int64 arrays (a NumPy bool column, like the bounds flags)
+    o60, o30, o15, circ = (
+        df[c].to_numpy(dtype=np.int64, na_value=0)
+        for c in ["late_over_60_count", "late_over_30_count", "late_over_15_count", "circulated"]
     )
+    df["check_late_chain_ok"] = (o60 <= o30) & (o30 <= o15) & (o15 <= circ)
 
     # Bounds for cause percentages
-    cause_cols = [
-        "pct_cause_external", "pct_cause_infra", "pct_cause_traffic",
-        "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers"
-    ]
-    for c in cause_cols:
-        if c in df.columns:
-            df[f"check_bounds_{c}"] = df[c].between(0, 100) | df[c].isna()
+    for c in cause_cols_in(df):
+        df[f"check_bounds_{c}"] = df[c].between(0, 100) | df[c].isna()
 
     return df
 
+def to_categorical(df: pd.DataFrame) -> pd.DataFrame:
+    # Groupby/isin on these keys then work on int codes instead of Python strings
+    conv = {
+        c: df[c].astype("category") for c in CATEGORICAL
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)
+    }
+    # Stations share one sorted dtype so departure/arrival codes compare like the names
+    shared = {"departure", "arrival"}.issubset(df.columns) and isinstance(df["departure"].dtype, pd.CategoricalDtype) \
+        and df["departure"].dtype == df["arrival"].dtype and df["departure"].cat.categories.is_monotonic_increasing
+    if {"departure", "arrival"}.issubset(df.columns) and not shared:
+        names = pd.concat([df["departure"], df["arrival"]]).dropna().astype(str).unique()
+        stations = pd.CategoricalDtype(sorted(names))
+        for c in ["departure", "arrival"]:
+            if df[c].dtype != stations:
+                conv[c] = df[c].astype(stations)
+    return df.assign(**conv) if conv else df
+
+def comment_strings(df: pd.DataFrame) -> pd.DataFrame:
+    # Mostly-empty free-text columns stored as one Arrow buffer each instead of a PyObject per cell
+    conv = {
+        c: df[c].astype("string[pyarrow]") for c in COMMENT_COLS
+        if c in df.columns and df[c].dtype != "string[pyarrow]"
+    }
+    return df.assign(**conv) if conv else df
+
+def pair_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Direction-agnostic endpoints, computed once so bidirectional views can group on them directly
+    if not {"departure", "arrival"}.issubset(df.columns) or "liaison_norm" in df.columns:
+        return df
+    dep, arr = df["departure"], df["arrival"]
+    if isinstance(dep.dtype, pd.CategoricalDtype) and dep.dtype == arr.dtype:
+        dep_codes, arr_codes = dep.cat.codes.to_numpy(), arr.cat.codes.to_numpy()
+        left_first = dep_codes <= arr_codes
+        dep_norm = pd.Series(pd.Categorical.from_codes(np.where(left_first, dep_codes, arr_codes), dtype=dep.dtype), index=df.index)
+        arr_norm = pd.Series(pd.Categorical.from_codes(np.where(left_first, arr_codes, dep_codes), dtype=dep.dtype), index=df.index)
+        liaison_norm = _liaison(dep_norm, arr_norm, " ↔ ")
+    else:
+        dep, arr = dep.astype(str), arr.astype(str)
+        left_first = (dep <= arr).to_numpy()
+        dep_norm = pd.Series(np.where(left_first, dep, arr), index=df.index).astype("category")
+        arr_norm = pd.Series(np.where(left_first, arr, dep), index=df.index).astype("category")
+        liaison_norm = (dep_norm.astype(str) + " ↔ " + arr_norm.astype(str)).astype("category")
+    return df.assign(dep_norm=dep_norm, arr_norm=arr_norm, liaison_norm=liaison_norm)
+
+def month_start_column(df: pd.DataFrame) -> pd.DataFrame:
+    # First day of each row's month as a plain NumPy cast; monthly groupbys key on it directly
+    if "date" not in df.columns or "month_start" in df.columns:
+        return df
+    months = df["date"].to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+    return df.assign(month_start=months)
+
+def month_key(df: pd.DataFrame) -> pd.Series:
+    # Month starts for grouping; precomputed at load by month_start_column
+    if "month_start" in df.columns:
+        return df["month_start"]
+    months = df["date"].to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+    return pd.Series(months, index=df.index, name="date")
+
+def f64(s: pd.Series, na_value=np.nan) -> np.ndarray:
+    # One typed extraction per column; callers then work on the plain array
+    return s.to_numpy(dtype=np.float64, na_value=na_value)
+
+def pct(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    # num / den * 100, NaN where den <= 0
+    return np.divide(num, den, out=np.full_like(num, np.nan), where=den > 0) * 100.0
+
+def contiguous_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Give any strided numeric column its own contiguous buffer so column reductions read sequentially
+    conv = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biuf":
+            arr = s.to_numpy()
+            if not arr.flags.c_contiguous:
+                conv[c] = np.ascontiguousarray(arr)
+    return df.assign(**conv) if conv else df
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    # Load-time layout shared by the CSV path and the Parquet cache; a no-op on an already prepared frame
+    return contiguous_columns(month_start_column(pair_columns(comment_strings(to_categorical(df)))))
+
+def frame_digest(df: pd.DataFrame) -> str:
+    # Content fingerprint over the row hashes in order, so reordered rows give a different digest (a sum would not)
+    return hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes(), digest_size=16).hexdigest()
+
+def month_labels(df: pd.DataFrame) -> tuple[str | None, pd.Series | None]:
+    # Resolve the month column once and return its YYYY-MM labels aligned to df.index
+    for c in ["month", "Month", "date", "Date"]:
+        if c not in df.columns:
+            continue
+        s = df[c]
+        if not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s.astype(str), errors="coerce")
+        if s.notna().any():
+            return c, s.dt.strftime("%Y-%m")
+    return None, None
+
+def month_grid(months_str: tuple) -> tuple:
+    # Parsed once per catalog: month starts as datetime64[D] plus YYYY-MM <-> date lookups
+    months_m = np.array(months_str, dtype="datetime64[M]")
+    months_np = months_m.astype("datetime64[D]")
+    months_dt = [m.item() for m in months_np]
+    # Month ordinals (months since 1970-01); a gap-free grid lets snapping index directly
+    ords = months_m.astype(np.int64)
+    first_ord = int(ords[0])
+    contiguous = bool(np.all(np.diff(ords) == 1))
+    return months_np, months_dt, first_ord, contiguous, dict(zip(months_str, months_dt)), dict(zip(months_dt, months_str))
+
+def _present_sorted(s: pd.Series) -> list:
+    # Sorted distinct non-null values; read off the codes when the categories are already sorted
+    if isinstance(s.dtype, pd.CategoricalDtype) and s.cat.categories.is_monotonic_increasing:
+        codes = np.unique(s.cat.codes.to_numpy())
+        return s.cat.categories[codes[codes >= 0]].tolist()
+    return sorted([v for v in s.dropna().unique()])
+
 def filter_values(df: pd.DataFrame) -> dict:
-    dates = pd.to_datetime(df["date"].dropna().unique())
-    dates_sorted = sorted(dates)
-    services = sorted([s for s in df["service"].dropna().unique()])
-    departures = sorted([s for s in df["departure"].dropna().unique()])
-    arrivals = sorted([s for s in df["arrival"].dropna().unique()])
+    # Distinct months via a hash pass, then a sort over just those
+    dates_sorted = pd.DatetimeIndex(np.sort(pd.to_datetime(df["date"].dropna().unique()).to_numpy()))
+    services = _present_sorted(df["service"])
+    departures = _present_sorted(df["departure"])
+    arrivals = _present_sorted(df["arrival"])
     duration_classes = ["< 1h30", "1h30–3h", "> 3h"]  # stable definition
+    date_options = dates_sorted.strftime("%Y-%m").tolist()
 
     return {
-        "date_min": dates_sorted[0] if dates_sorted else None,
-        "date_max": dates_sorted[-1] if dates_sorted else None,
-        "date_options": [d.strftime("%Y-%m") for d in dates_sorted],
+        "date_min": dates_sorted[0] if len(dates_sorted) else None,
+        "date_max": dates_sorted[-1] if len(dates_sorted) else None,
+        "date_options": date_options,
+        # Parsed month grid for the date slider, built once per dataset
+        "date_grid": month_grid(tuple(date_options)) if date_options else None,
         "services": services,
         "departures": departures,
         "arrivals": arrivals,
         "duration_classes": duration_classes,
+        # Membership sets for validating stored sidebar selections
+        "services_set": frozenset(services),
+        "duration_classes_set": frozenset(duration_classes),
     }
\ No newline at end of file
@@ -1,128 +1,168 @@
 import pandas as pd
 import numpy as np
 
+from utils.prep import f64, month_key, pct
+
 CORE_KEYS = ["date", "service", "departure", "arrival"]
 
 def missingness_table(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["column", "missing_count", "missing_pct"])
-    miss_ct = df.isna().sum().rename("missing_count")
-    miss_pct = (df.isna().mean() * 100).round(2).rename("missing_pct")
-    out = pd.concat([miss_ct, miss_pct], axis=1).reset_index().rename(columns={"index": "column"})
+    # One NA mask; the percentage is derived from the counts
+    miss_ct = df.isna().sum()
+    out = pd.DataFrame({
+        "column": miss_ct.index,
+        "missing_count": miss_ct.to_numpy(),
+        "missing_pct": (miss_ct / len(df) * 100).round(2).to_numpy(),
+    })
     return out.sort_values("missing_pct", ascending=False)
 
-def duplicate_keys(df: pd.DataFrame) -> pd.DataFrame:
+def duplicate_masks(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+    # Hash the key columns once and fold the remaining columns into it for full-row duplicates
+    if df.empty:
+        empty = pd.Series(False, index=df.index)
+        return empty, empty.copy()
+
+    keys = [c for c in CORE_KEYS if c in df.columns]
+    rest = [c for c in df.columns if c not in keys]
+
+    def hash_cols(cols):
+        return pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+
+    if len(keys) == len(CORE_KEYS):
+        key_hash = hash_cols(keys)
+        key_mask = pd.Series(key_hash, index=df.index).duplicated(keep=False)
+    else:
+        key_hash = hash_cols(keys) if keys else np.zeros(len(df), dtype=np.uint64)
+        key_mask = pd.Series(False, index=df.index)
+
+    full_hash = key_hash
+    if rest:
+        full_hash = key_hash * np.uint64(1000003) ^ hash_cols(rest)
+    full_mask = pd.Series(full_hash, index=df.index).duplicated(keep=False)
+    return key_mask, full_mask
+
+def duplicate_keys(df: pd.DataFrame, key_mask: pd.Series | None = None) -> pd.DataFrame:
     if df.empty or not set(CORE_KEYS).issubset(df.columns):
         return pd.DataFrame(columns=CORE_KEYS + ["count"])
-    g = df.groupby(CORE_KEYS, dropna=False).size().reset_index(name="count")
-    return g[g["count"] > 1].sort_values("count", ascending=False)
+    if key_mask is None:
+        key_mask, _ = duplicate_masks(df)
+    if not key_mask.any():
+        return pd.DataFrame(columns=CORE_KEYS + ["count"])
+    # Counts come back sorted, largest first
+    vc = df.loc[key_mask, CORE_KEYS].value_counts(dropna=False)
+    return vc[vc > 1].reset_index(name="count")
+
+def full_row_duplicates(df: pd.DataFrame, full_mask: pd.Series | None = None) -> pd.DataFrame:
+    if df.empty:
+        return df.iloc[0:0]
+    if full_mask is None:
+        _, full_mask = duplicate_masks(df)
+    return df.loc[full_mask]
+
+def _row_major_hits(df: pd.DataFrame, checks: list, cols: tuple[str, str]) -> pd.DataFrame:
+    # checks: (label, violation mask, payload(row positions) -> array) in the order they apply within a row.
+    # Hits are sorted by row, then check, to match a row-by-row scan.
+    rows, order, payloads = [], [], []
+    for k, (_, mask, payload) in enumerate(checks):
+        hit = np.flatnonzero(mask.to_numpy(dtype=bool, na_value=False))
+        if len(hit):
+            rows.append(hit)
+            order.append(np.full(len(hit), k, dtype=np.intp))
+            payloads.append(payload(hit))
+    if not rows:
+        return pd.DataFrame()
+
+    rows, order = np.concatenate(rows), np.concatenate(order)
+    sort = np.lexsort((order, rows))
+    labels = np.array([c[0] for c in checks], dtype=object)
+    # Typed columns built from arrays; payloads keep their NumPy dtype (ints and floats concatenate to float64)
+    return pd.DataFrame({
+        "row_id": df.index.to_numpy()[rows[sort]].astype(np.int64),
+        cols[0]: labels[order[sort]],
+        cols[1]: np.concatenate(payloads)[sort],
+    })
+
+def _values(s: pd.Series):
+    # Hits are never missing, so nullable integer columns come back as int64
+    return lambda hit: s.iloc[hit].to_numpy()
+
+def _pair(a: pd.Series, b: pd.Series):
+    return lambda hit: np.array(
+        [f"{x} > {y}" for x, y in zip(a.to_numpy(dtype=object)[hit], b.to_numpy(dtype=object)[hit])], dtype=object
+    )
 
 def bounds_issues(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["row_id", "issue", "value"])
 
-    checks = []
-    def add_issue(idx, issue, value):
-        checks.append({"row_id": int(idx), "issue": issue, "value": value})
-
     pct_cols = [c for c in df.columns if c.startswith("pct_")]
     count_cols = [c for c in df.columns if c.endswith("_count")] + ["planned", "canceled", "circulated", "late_arr_count"]
     duration_col = "duration_min" if "duration_min" in df.columns else "duration"
 
-    for idx, row in df.iterrows():
-        # percentages in [0,100]
-        for c in pct_cols:
-            v = row[c]
-            if pd.notna(v) and (v < 0 or v > 100):
-                add_issue(idx, f"{c} outside [0,100]", v)
-
-        # counts >= 0
-        for c in count_cols:
-            if c in df.columns:
-                v = row[c]
-                if pd.notna(v) and v < 0:
-                    add_issue(idx, f"{c} negative", v)
-
-        # duration > 0
-        if duration_col in df.columns:
-            v = row[duration_col]
-            if pd.notna(v) and v <= 0:
-                add_issue(idx, f"{duration_col} non-positive", v)
-
-    return pd.DataFrame(checks)
+    checks = []
+    # percentages in [0,100]
+    for c in pct_cols:
+        checks.append((f"{c} outside [0,100]", (df[c] < 0) | (df[c] > 100), _values(df[c])))
+    # counts >= 0
+    for c in count_cols:
+        if c in df.columns:
+            checks.append((f"{c} negative", df[c] < 0, _values(df[c])))
+    # duration > 0
+    if duration_col in df.columns:
+        checks.append((f"{duration_col} non-positive", df[duration_col] <= 0, _values(df[duration_col])))
+
+    return _row_major_hits(df, checks, ("issue", "value"))
 
 def logical_consistency(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["row_id", "rule", "details"])
 
-    rules = []
-    def add(idx, rule, details):
-        rules.append({"row_id": int(idx), "rule": rule, "details": details})
-
-    c15 = "late_over_15_count" if "late_over_15_count" in df.columns else None
-    c30 = "late_over_30_count" if "late_over_30_count" in df.columns else None
-    c60 = "late_over_60_count" if "late_over_60_count" in df.columns else None
-
-    for idx, r in df.iterrows():
-        circ = r["circulated"] if "circulated" in df.columns else np.nan
-        late = r["late_arr_count"] if "late_arr_count" in df.columns else np.nan
-
-        if pd.notna(late) and pd.notna(circ) and late > circ:
-            add(idx, "late_arr_count ≤ circulated violated", f"{late} > {circ}")
-
-        if c15 and c15 in df.columns and pd.notna(r.get(c15)) and pd.notna(circ) and r[c15] > circ:
-            add(idx, "≥15 ≤ circulated violated", f"{r[c15]} > {circ}")
-
-        if c30 and c15 and pd.notna(r.get(c30)) and pd.notna(r.get(c15)) and r[c30] > r[c15]:
-            add(idx, "≥30 ≤ ≥15 violated", f"{r[c30]} > {r[c15]}")
-
-        if c60 and c30 and pd.notna(r.get(c60)) and pd.notna(r.get(c30)) and r[c60] > r[c30]:
-            add(idx, "≥60 ≤ ≥30 violated", f"{r[c60]} > {r[c30]}")
-
+    # (rule, larger column, smaller column); comparisons with a missing side are not violations
+    pairs = [
+        ("late_arr_count ≤ circulated violated", "late_arr_count", "circulated"),
+        ("≥15 ≤ circulated violated", "late_over_15_count", "circulated"),
+        ("≥30 ≤ ≥15 violated", "late_over_30_count", "late_over_15_count"),
+        ("≥60 ≤ ≥30 violated", "late_over_60_count", "late_over_30_count"),
         # mean(all trains) ≤ mean(delayed only)
-        a_all = r.get("avg_delay_arr_all_min", np.nan)
-        a_del = r.get("avg_delay_arr_delayed_min", np.nan)
-        if pd.notna(a_all) and pd.notna(a_del) and a_all > a_del:
-            add(idx, "avg(all) ≤ avg(delayed) violated", f"{a_all} > {a_del}")
-
-    return pd.DataFrame(rules)
+        ("avg(all) ≤ avg(delayed) violated", "avg_delay_arr_all_min", "avg_delay_arr_delayed_min"),
+    ]
+    checks = [
+        (rule, df[a].gt(df[b]), _pair(df[a], df[b]))
+        for rule, a, b in pairs if a in df.columns and b in df.columns
+    ]
+    return _row_major_hits(df, checks, ("rule", "details"))
 
 def outlier_months(df: pd.DataFrame, method: str = "iqr", threshold: float = 1.5) -> pd.DataFrame:
     if df.empty or "liaison" not in df.columns or "date" not in df.columns:
         return pd.DataFrame(columns=["date", "liaison", "on_time_pct", "flag"])
 
-    d = df.copy()
-    if "on_time_pct_row" not in d.columns:
-        if {"circulated", "late_arr_count"}.issubset(d.columns):
-            d["on_time_pct_row"] = np.where(
-                d["circulated"] > 0,
-                (d["circulated"] - d["late_arr_count"]) / d["circulated"] * 100.0,
-                np.nan,
-            )
+    extra = {}
+    if "on_time_pct_row" not in df.columns:
+        if {"circulated", "late_arr_count"}.issubset(df.columns):
+            circ = f64(df["circulated"])
+            extra["on_time_pct_row"] = pct(circ - f64(df["late_arr_count"]), circ)
         else:
-            d["on_time_pct_row"] = np.nan
+            extra["on_time_pct_row"] = np.nan
 
-    d["month"] = d["date"].dt.to_period("M").dt.to_timestamp()
-    grp = d.dropna(subset=["on_time_pct_row"]).groupby(["liaison", "month"])["on_time_pct_row"].mean().reset_index()
+    # Only the columns the grouping needs; month starts come precomputed from the load step
+    keep = ["liaison"] + (["on_time_pct_row"] if "on_time_pct_row" in df.columns else [])
+    d = df[keep].assign(month=month_key(df), **extra)
+    grp = d.dropna(subset=["on_time_pct_row"]).groupby(["liaison", "month"], observed=True)["on_time_pct_row"].mean().reset_index()
 
     if grp.empty:
         return pd.DataFrame(columns=["date", "liaison", "on_time_pct", "flag"])
 
-    def flag_group(g):
-        if g["on_time_pct_row"].nunique() <= 1:
-            g["flag"] = False
-            return g
-        x = g["on_time_pct_row"]
-        if method == "z":
-            z = (x - x.mean()) / (x.std(ddof=0) + 1e-9)
-            g["flag"] = z < -threshold
-        else:
-            q1, q3 = x.quantile(0.25), x.quantile(0.75)
-            iqr = (q3 - q1) + 1e-9
-            lower = q1 - threshold * iqr
-            g["flag"] = x < lower
-        return g
-
-    flagged = grp.groupby("liaison", group_keys=False).apply(flag_group)
+    # Per-liaison statistics broadcast back to each month; liaisons with a single distinct value are never flagged
+    x = grp["on_time_pct_row"]
+    gb = x.groupby(grp["liaison"], observed=True)
+    if method == "z":
+        z = (x - gb.transform("mean")) / (gb.transform("std", ddof=0) + 1e-9)
+        flag = z < -threshold
+    else:
+        q1, q3 = gb.transform("quantile", 0.25), gb.transform("quantile", 0.75)
+        iqr = (q3 - q1) + 1e-9
+        flag = x < q1 - threshold * iqr
+    flagged = grp.assign(flag=flag & (gb.transform("nunique") > 1))
     flagged = flagged[flagged["flag"]].rename(columns={"month": "date", "on_time_pct_row": "on_time_pct"})
     return flagged[["date", "liaison", "on_time_pct", "flag"]].sort_values(["date", "liaison"])
\ No newline at end of file
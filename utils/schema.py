@@ -0,0 +1,36 @@
+# Column groups shared by the compute helpers and pages
+
+CAUSE_COLS = (
+    "pct_cause_external", "pct_cause_infra", "pct_cause_traffic",
+    "pct_cause_rollingstock", "pct_cause_station_reuse", "pct_cause_passengers",
+)
+
+CAUSE_LABELS = {
+    "pct_cause_external": "External",
+    "pct_cause_infra": "Infrastructure",
+    "pct_cause_traffic": "Traffic",
+    "pct_cause_rollingstock": "Rolling stock",
+    "pct_cause_station_reuse": "Station ops & reuse",
+    "pct_cause_passengers": "Passengers / PSH / connections",
+}
+
+# The composition views spell out the traffic cause
+COMPOSITION_LABELS = {**CAUSE_LABELS, "pct_cause_traffic": "Traffic management"}
+
+BUCKET_COLS = {
+    "≥15": "late_over_15_count",
+    "≥30": "late_over_30_count",
+    "≥60": "late_over_60_count",
+}
+
+# Helper columns added at load time (utils.prep), not part of the source data
+DERIVED_COLS = ("dep_norm", "arr_norm", "liaison_norm", "month_start")
+
+def cause_cols_in(df) -> list[str]:
+    return [c for c in CAUSE_COLS if c in df.columns]
+
+def bucket_cols_in(df) -> dict[str, str]:
+    return {k: v for k, v in BUCKET_COLS.items() if v in df.columns}
+
+def source_cols_in(df) -> list[str]:
+    return [c for c in df.columns if c not in DERIVED_COLS]
@@ -1,101 +1,204 @@
-import plotly.express as px
+import functools
+import hashlib
+import logging
+import streamlit as st
 import plotly.graph_objects as go
+import plotly.io as pio
+# plotly.express is imported inside the few builders that still use it, so pages without them skip its import
+from plotly.colors import qualitative, sequential
 import numpy as np
-
-def theme():
-    return {"template": "plotly_white", "height": 380}
-
+import pandas as pd
+
+from utils.prep import frame_digest
+
+# orjson encodes the numeric arrays in figure JSON natively (no list conversion); Plotly's encoder otherwise
+try:
+    import orjson
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    pass
+
+_log = logging.getLogger(__name__)
+
+_FIGURES = {}
+
+def _fingerprint(v):
+    # Frames are keyed by content (small aggregates here), row order included; other arguments are hashed by
+    # Streamlit as they are
+    if isinstance(v, pd.DataFrame):
+        return ("frame", v.shape, tuple(map(str, v.columns)), tuple(map(repr, v.dtypes)), frame_digest(v))
+    return v
+
+def _figure_digest(fig):
+    # Builders return a figure, None, or a tuple of those (bar_ranking)
+    if isinstance(fig, tuple):
+        return tuple(map(_figure_digest, fig))
+    return None if fig is None else hashlib.blake2b(fig.to_json().encode(), digest_size=16).digest()
+
+# cache_resource hands the same Figure object to every session, so builder results are read-only: pass them to
+# st.plotly_chart as they are, or copy with go.Figure(fig) before changing them (a copy per call would cost more
+# than most builds). The digest taken at build time lets the wrapper notice a caller that broke this.
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _figure_call(name: str, key: tuple, generation: int, _args: tuple, _kwargs: dict):
+    fig = _FIGURES[name](*_args, **_kwargs)
+    return fig, _figure_digest(fig)
+
+# Bumped per builder when one of its cached figures is found modified; the old entries then age out of the cache
+_GENERATION = {}
+
+def _cached_figure(fn):
+    # Rebuild a figure only when its input frames or parameters change (no-op reruns reuse it)
+    _FIGURES[fn.__name__] = fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (tuple(_fingerprint(a) for a in args), tuple(sorted((k, _fingerprint(v)) for k, v in kwargs.items())))
+        except TypeError:
+            # Unhashable cells (e.g. lists): build directly
+            return fn(*args, **kwargs)
+        generation = _GENERATION.get(fn.__name__, 0)
+        fig, digest = _figure_call(fn.__name__, key, generation, args, kwargs)
+        if _figure_digest(fig) != digest:
+            _log.warning("%s: a cached figure was modified in place; rebuilding it", fn.__name__)
+            _GENERATION[fn.__name__] = generation = generation + 1
+            fig, _ = _figure_call(fn.__name__, key, generation, args, kwargs)
+        return fig
+    return wrapper
+
+def _hline(y, opacity: float, **line):
+    # The shape fig.add_hline would add, as a plain dict for a single layout update
+    return dict(type="line", xref="x domain", x0=0, x1=1, yref="y", y0=y, y1=y, line=line, opacity=opacity)
+
+def _vline(x, opacity: float, **line):
+    return dict(type="line", xref="x", x0=x, x1=x, yref="y domain", y0=0, y1=1, line=line, opacity=opacity)
+
+# Shared chart settings, built once at import
+_THEME = {"template": "plotly_white", "height": 380}
+_PCT_COLS = frozenset(("on_time_pct", "cancel_rate_pct"))
+
+def _colorway() -> tuple:
+    # The discrete colors px assigns: the default template's colorway (under Streamlit, placeholder colors the
+    # frontend swaps for the app theme), else px's D3 fallback
+    name = pio.templates.default
+    colorway = pio.templates[name].layout.colorway if name else None
+    return tuple(colorway) if colorway else tuple(qualitative.D3)
+
+LORENZ_MAX_POINTS = 500
+
+def _f32(values) -> np.ndarray:
+    # Plotted rates and delays are shown to a decimal or two; float32 halves their typed-array payload in the
+    # figure JSON (integer counts are already sent in the narrowest int type)
+    if isinstance(values, pd.Series):
+        return values.to_numpy(dtype=np.float32, na_value=np.nan)
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+def _monthly_points(df, y_col: str):
+    # One point per month: row-level input is averaged per month so only plotted points reach the figure JSON
+    d = df[["date", y_col]]
+    if d["date"].duplicated().any():
+        d = d.groupby(pd.Grouper(key="date", freq="MS"))[y_col].mean().dropna().reset_index()
+    return d
+
+@_cached_figure
 def line_monthly_enhanced(df, y_col: str, title: str, ref_line: float | None = None, annotate_extrema: bool = True):
-    cfg = theme()
-    fig = px.line(df, x="date", y=y_col, markers=True, title=title)
-    fig.update_layout(template=cfg["template"], height=cfg["height"], legend_title_text="")
-    if y_col in ("on_time_pct", "cancel_rate_pct"):
-        fig.update_yaxes(title=None, ticksuffix=" %")
-    else:
-        fig.update_yaxes(title=None)
-    fig.update_xaxes(title=None)
+    df = _monthly_points(df, y_col)
+    is_pct = y_col in _PCT_COLS
 
-    # Ref line (target)
+    # Reference line and extrema collected first, then set with the rest of the layout in one pass
+    shapes, annotations = [], []
     if ref_line is not None:
-        fig.add_hline(y=ref_line, line_dash="dot", line_width=1, opacity=0.6)
-        fig.add_annotation(
+        shapes.append(_hline(ref_line, dash="dot", width=1, opacity=0.6))
+        annotations.append(dict(
             xref="paper", x=1.005, y=ref_line, yref="y",
-            text=f"{ref_line:g}" + ("%" if y_col in ("on_time_pct", "cancel_rate_pct") else ""),
+            text=f"{ref_line:g}" + ("%" if is_pct else ""),
             showarrow=False, font=dict(size=11), xanchor="left"
-        )
-
-    # Annotate min/max points
-    if annotate_extrema and df[y_col].notna().any():
-        y_min = df.loc[df[y_col].idxmin()]
-        y_max = df.loc[df[y_col].idxmax()]
-        unit = "%" if y_col in ("on_time_pct", "cancel_rate_pct") else " min"
-
-        fig.add_annotation(
-            x=y_max["date"], y=y_max[y_col],
-            text=f"max {y_max[y_col]:.1f}{unit}",
-            showarrow=True,
-            arrowhead=2,
-            yshift=10,
+        ))
+
+    # Annotate min/max points, read off the plotted arrays (first occurrence wins, as with idxmin/idxmax)
+    y = df[y_col].to_numpy(dtype=np.float64, na_value=np.nan) if annotate_extrema else np.empty(0)
+    valid = ~np.isnan(y)
+    if valid.any():
+        yv, dv = y[valid], df["date"].to_numpy()[valid]
+        i_min, i_max = yv.argmin(), yv.argmax()
+        unit = "%" if is_pct else " min"
+        annotations.append(dict(
+            x=pd.Timestamp(dv[i_max]), y=yv[i_max],
+            text=f"max {yv[i_max]:.1f}{unit}",
+            showarrow=True, arrowhead=2, yshift=10,
             font=dict(size=11)
-        )
-
-        fig.add_annotation(
-            x=y_min["date"], y=y_min[y_col],
-            text=f"min {y_min[y_col]:.1f}{unit}",
-            showarrow=True,
-            arrowhead=2,
-            ax=-40, ay=0,       
-            standoff=6,         
-            xanchor="right",  
-            align="right", 
+        ))
+        annotations.append(dict(
+            x=pd.Timestamp(dv[i_min]), y=yv[i_min],
+            text=f"min {yv[i_min]:.1f}{unit}",
+            showarrow=True, arrowhead=2,
+            ax=-40, ay=0, standoff=6,
+            xanchor="right", align="right",
             font=dict(size=11),
-        )
-
-
-    return fig
+        ))
+
+    # Single trace from plain arrays, with the hover text px.line would set
+    return go.Figure(
+        go.Scatter(
+            x=df["date"].to_numpy(), y=_f32(df[y_col]), mode="lines+markers", showlegend=False,
+            line_color=_colorway()[0],
+            hovertemplate=f"date=%{{x}}<br>{y_col}=%{{y}}<extra></extra>",
+        ),
+        layout=dict(
+            title=title, template=_THEME["template"], height=_THEME["height"], legend_title_text="",
+            xaxis=dict(title=None), yaxis=dict(title=None, ticksuffix=" %" if is_pct else None),
+            shapes=shapes, annotations=annotations,
+        ),
+    )
 
+@_cached_figure
 def line_duration(df, title: str):
-    cfg = theme()
-    fig = px.line(
-        df, x="date", y="on_time_pct", color="duration_class",
-        markers=True,
-        title=title,
+    # One trace per class in order of appearance, as px.line(color=...) would group them; rows are split on the
+    # class codes (the loaded frame is already categorical)
+    cls = df["duration_class"]
+    if not isinstance(cls.dtype, pd.CategoricalDtype):
+        cls = cls.astype("category")
+    codes = cls.cat.codes.to_numpy()
+    x, y = df["date"].to_numpy(), _f32(df["on_time_pct"])
+    colors = _colorway()
+    traces = []
+    for i, k in enumerate(pd.unique(codes[codes >= 0])):
+        m = codes == k
+        name = str(cls.cat.categories[k])
+        traces.append(go.Scatter(
+            x=x[m], y=y[m], mode="lines+markers", name=name, legendgroup=name, line_color=colors[i % len(colors)],
+            hovertemplate=f"duration_class={name}<br>date=%{{x}}<br>on_time_pct=%{{y}}<extra></extra>",
+        ))
+    return go.Figure(traces, layout=dict(
+        title=title, template=_THEME["template"], height=_THEME["height"], legend_title_text="Duration",
+        xaxis=dict(title=None), yaxis=dict(title=None, ticksuffix=" %"),
+    ))
+
+def _hbar(ranked, title: str):
+    # Horizontal rank_metric-by-liaison bars, read straight off the liaison index
+    return go.Figure(
+        go.Bar(
+            x=ranked["rank_metric"].to_numpy(), y=ranked.index.to_numpy(), orientation="h", showlegend=False,
+            marker_color=_colorway()[0],
+            hovertemplate="rank_metric=%{x}<br>liaison=%{y}<extra></extra>",
+        ),
+        layout=dict(
+            title=title, barmode="relative", template=_THEME["template"], height=450,
+            xaxis=dict(title=None), yaxis=dict(autorange="reversed", title=None),
+        ),
     )
-    fig.update_layout(template=cfg["template"], height=cfg["height"], legend_title_text="Duration")
-    fig.update_yaxes(title=None, ticksuffix=" %")
-    fig.update_xaxes(title=None)
-    return fig
 
+@_cached_figure
 def bar_ranking(top_df, bottom_df, metric_label: str):
-    top_plot = top_df.reset_index().rename(columns={"index": "liaison"})
-    bottom_plot = bottom_df.reset_index().rename(columns={"index": "liaison"})
-
-    fig_top = px.bar(
-        top_plot,
-        x="rank_metric",
-        y="liaison",
-        orientation="h",
-        title=f"Top 10 liaisons by {metric_label}",
-    )
-    fig_top.update_layout(template="plotly_white", height=450, yaxis=dict(autorange="reversed"))
-    fig_top.update_xaxes(title=None)
-    fig_top.update_yaxes(title=None)
-
-    fig_bottom = px.bar(
-        bottom_plot,
-        x="rank_metric",
-        y="liaison",
-        orientation="h",
-        title=f"Bottom 10 liaisons by {metric_label}",
-    )
-    fig_bottom.update_layout(template="plotly_white", height=450, yaxis=dict(autorange="reversed"))
-    fig_bottom.update_xaxes(title=None)
-    fig_bottom.update_yaxes(title=None)
-
+    fig_top = _hbar(top_df, f"Top 10 liaisons by {metric_label}")
+    fig_bottom = _hbar(bottom_df, f"Bottom 10 liaisons by {metric_label}")
     return fig_top, fig_bottom
 
 
+@_cached_figure
 def box_delay_distribution(df):
+    import plotly.express as px
+
     fig = px.box(
         df,
         x="duration_class",
@@ -103,12 +206,16 @@ def box_delay_distribution(df):
         points="outliers",
         title="Distribution of arrival delays (delayed trains)",
     )
-    fig.update_layout(template="plotly_white", height=400)
-    fig.update_yaxes(title="Delay (min)")
-    fig.update_xaxes(title="Duration class")
+    fig.update_layout(
+        template=_THEME["template"], height=400,
+        xaxis=dict(title="Duration class"), yaxis=dict(title="Delay (min)"),
+    )
     return fig
 
+@_cached_figure
 def stacked_causes(df_long, title: str, horizontal: bool = False):
+    import plotly.express as px
+
     if df_long.empty:
         return None
 
@@ -117,97 +224,152 @@ def stacked_causes(df_long, title: str, horizontal: bool = False):
     else:
         fig = px.bar(df_long, x="group", y="pct", color="cause", title=title)
 
-    fig.update_layout(template="plotly_white", height=420, legend_title_text="Cause")
-    fig.update_yaxes(title=None if horizontal else "Percentage", ticksuffix="" if horizontal else " %")
-    fig.update_xaxes(title=None)
-    if not horizontal:
-        fig.update_yaxes(ticksuffix=" %")
+    fig.update_layout(
+        template=_THEME["template"], height=420, legend_title_text="Cause",
+        xaxis=dict(title=None),
+        yaxis=dict(title=None if horizontal else "Percentage", ticksuffix="" if horizontal else " %"),
+    )
     return fig
 
 
+@_cached_figure
 def grouped_severity(df_counts, title: str, horizontal: bool = False):
+    import plotly.express as px
+
     if df_counts.empty:
         return None
 
     if horizontal:
         fig = px.bar(df_counts, x="count", y="group", orientation="h", title=title)
-        fig.update_yaxes(title=None)
-        fig.update_xaxes(title="Count")
     else:
         fig = px.bar(df_counts, x="group", y="count", title=title)
-        fig.update_yaxes(title="Count")
-        fig.update_xaxes(title=None)
 
-    fig.update_layout(template="plotly_white", height=380)
+    fig.update_layout(
+        template=_THEME["template"], height=_THEME["height"],
+        xaxis=dict(title="Count" if horizontal else None), yaxis=dict(title=None if horizontal else "Count"),
+    )
     return fig
 
+@_cached_figure
 def scatter_performance(df, color_by: str = "service", x_ref: float | None = 90.0, y_ref: float | None = 30.0):
     if df.empty:
         return None
 
-    cfg = theme()
     color_col = color_by if color_by in df.columns else None
 
-    fig = px.scatter(
-        df, x="on_time_pct", y="avg_delay_arr_delayed_min",
-        size="circulated", color=color_col,
-        hover_name="liaison",
-        hover_data={"circulated":":,", "late_arr_count":":,", "cancel_rate_pct":":.1f", "late_rate_pct":":.1f"},
-        title=f"Reliability vs. severity ({'color: ' + color_col if color_col else 'no grouping'})",
+    # One marker trace per color group in order of appearance, as px.scatter(color=...) groups them. The hover
+    # columns go into one customdata matrix formatted by a fixed template, and marker areas scale like px's
+    # (largest bubble 20 px)
+    x, y = _f32(df["on_time_pct"]), _f32(df["avg_delay_arr_delayed_min"])
+    size = df["circulated"].to_numpy()
+    names = df["liaison"].to_numpy(dtype=object)
+    hover_cols = {"circulated": ",", "late_arr_count": ",", "cancel_rate_pct": ".1f", "late_rate_pct": ".1f"}
+    customdata = np.column_stack([df[c].to_numpy(dtype=np.float64, na_value=np.nan) for c in hover_cols])
+    hover = "<br>".join(
+        ["on_time_pct=%{x}", "avg_delay_arr_delayed_min=%{y}"]
+        + [f"{c}=%{{customdata[{i}]:{fmt}}}" for i, (c, fmt) in enumerate(hover_cols.items())]
     )
-    fig.update_layout(template=cfg["template"], height=420, legend_title_text=color_col or "")
-    fig.update_xaxes(title="On-time arrival %", rangemode="tozero")
-    fig.update_yaxes(title="Avg delay (late trains, min)", rangemode="tozero")
+    marker = dict(sizemode="area", sizeref=df["circulated"].max() / 20 ** 2, symbol="circle")
 
+    if color_col:
+        # Rows without a group are left out, as px does
+        groups = df[color_col].to_numpy(dtype=object)
+        labels = pd.unique(df[color_col].dropna().to_numpy(dtype=object))
+    else:
+        groups, labels = None, [None]
+    colors = _colorway()
+    traces = []
+    for i, label in enumerate(labels):
+        m = slice(None) if groups is None else groups == label
+        head = "<b>%{hovertext}</b><br><br>" + ("" if label is None else f"{color_col}={label}<br>")
+        traces.append(go.Scatter(
+            x=x[m], y=y[m], mode="markers", name="" if label is None else str(label),
+            legendgroup="" if label is None else str(label), showlegend=label is not None,
+            marker=dict(marker, color=colors[i % len(colors)], size=size[m]),
+            hovertext=names[m], customdata=customdata[m], hovertemplate=head + hover + "<extra></extra>",
+        ))
+
+    shapes, annotations = [], []
     if x_ref is not None:
-        fig.add_vline(x=x_ref, line_dash="dot", line_width=1, opacity=0.6)
-        fig.add_annotation(x=x_ref, yref="paper", y=1.02, showarrow=False, text=f"{x_ref:g}% target", xanchor="left")
+        shapes.append(_vline(x_ref, dash="dot", width=1, opacity=0.6))
+        annotations.append(dict(x=x_ref, yref="paper", y=1.02, showarrow=False, text=f"{x_ref:g}% target", xanchor="left"))
     if y_ref is not None:
-        fig.add_hline(y=y_ref, line_dash="dot", line_width=1, opacity=0.6)
-        fig.add_annotation(y=y_ref, xref="paper", x=1.01, showarrow=False, text=f"{y_ref:g} min", yanchor="bottom")
-
-    return fig
+        shapes.append(_hline(y_ref, dash="dot", width=1, opacity=0.6))
+        annotations.append(dict(y=y_ref, xref="paper", x=1.01, showarrow=False, text=f"{y_ref:g} min", yanchor="bottom"))
 
+    return go.Figure(traces, layout=dict(
+        title=f"Reliability vs. severity ({'color: ' + color_col if color_col else 'no grouping'})",
+        template=_THEME["template"], height=420, legend_title_text=color_col or "",
+        legend_tracegroupgap=0, legend_itemsizing="constant",
+        xaxis=dict(title="On-time arrival %", rangemode="tozero"),
+        yaxis=dict(title="Avg delay (late trains, min)", rangemode="tozero"),
+        shapes=shapes, annotations=annotations,
+    ))
+
+def _lorenz_curve(vals: np.ndarray):
+    # Counts sorted largest first, cumulated and scaled to percentages; None when there is nothing to draw
+    vals = vals[~np.isnan(vals)]
+    total = vals.sum()
+    if vals.size == 0 or total <= 0:
+        return None
+    # The mask above already copied, so sort in place and accumulate over a reversed view
+    vals.sort()
+    n = vals.size
+    cum_liaisons = np.arange(1, n + 1) / n * 100.0
+    cum_late_share = np.cumsum(vals[::-1]) / total * 100.0
+    # Evenly spaced points (first and last kept) are enough to draw the curve
+    if n > LORENZ_MAX_POINTS:
+        keep = np.unique(np.linspace(0, n - 1, LORENZ_MAX_POINTS).round().astype(int))
+        cum_liaisons, cum_late_share = cum_liaisons[keep], cum_late_share[keep]
+    return cum_liaisons, cum_late_share
+
+@_cached_figure
 def lorenz_late_share(df):
     if df.empty or "late_arr_count" not in df.columns:
         return None
 
-    d = df[["liaison","late_arr_count"]].dropna().sort_values("late_arr_count", ascending=False).reset_index(drop=True)
-    total = d["late_arr_count"].sum()
-    if total <= 0:
+    vals = df["late_arr_count"].to_numpy(dtype=np.float64, na_value=np.nan)
+    curve = _lorenz_curve(vals[~df["liaison"].isna().to_numpy()])
+    if curve is None:
         return None
+    cum_liaisons, cum_late_share = curve
+
+    return go.Figure(
+        [
+            go.Scatter(
+                x=_f32(cum_liaisons), y=_f32(cum_late_share), mode="lines", showlegend=False,
+                line_color=_colorway()[0],
+                hovertemplate="cum_liaisons=%{x}<br>cum_late_share=%{y}<extra></extra>",
+            ),
+            # Line of equality
+            go.Scatter(x=[0,100], y=[0,100], mode="lines", line=dict(dash="dot"), showlegend=False),
+        ],
+        layout=dict(
+            title="Concentration of late arrivals across liaisons",
+            template=_THEME["template"], height=_THEME["height"], showlegend=False,
+            xaxis=dict(title="Cumulative liaisons (%)", range=[0,100]),
+            yaxis=dict(title="Cumulative late arrivals (%)", range=[0,100]),
+        ),
+    )
 
-    d["cum_liaisons"] = (np.arange(len(d)) + 1) / len(d) * 100.0
-    d["cum_late_share"] = d["late_arr_count"].cumsum() / total * 100.0
-
-    cfg = theme()
-    fig = px.line(d, x="cum_liaisons", y="cum_late_share", title="Concentration of late arrivals across liaisons")
-    fig.update_layout(template=cfg["template"], height=380, showlegend=False)
-    fig.update_xaxes(title="Cumulative liaisons (%)", range=[0,100])
-    fig.update_yaxes(title="Cumulative late arrivals (%)", range=[0,100])
-
-    # Line of equality
-    fig.add_trace(go.Scatter(x=[0,100], y=[0,100], mode="lines", line=dict(dash="dot"), showlegend=False))
-
-    return fig
-
+@_cached_figure
 def heatmap_causes_month(pivot_df, title: str):
     if pivot_df.empty:
         return None
     mat = pivot_df.set_index("month").sort_index()
-    fig = px.imshow(
-        mat.T,
-        aspect="auto",
-        color_continuous_scale="Blues",
-        title=title,
-        labels=dict(color="% share"),
+    # (cause x month) shares, the bulk of this figure's payload, as one float32 buffer; the trace mirrors what
+    # px.imshow built (first cause on top, px's 9-step Blues, same hover text)
+    return go.Figure(
+        go.Heatmap(
+            z=_f32(mat.to_numpy(dtype=np.float32, na_value=np.nan).T), x=mat.index.to_numpy(), y=mat.columns.to_numpy(),
+            colorscale=sequential.Blues, colorbar=dict(title="% share"),
+            hovertemplate="month: %{x}<br>y: %{y}<br>% share: %{z}<extra></extra>",
+        ),
+        layout=dict(
+            title=title, template=_THEME["template"], height=420,
+            xaxis=dict(title=None), yaxis=dict(title=None, autorange="reversed"),
+        ),
     )
-    fig.update_layout(template="plotly_white", height=420)
-    fig.update_yaxes(title=None)
-    fig.update_xaxes(title=None)
-    return fig
-
-import plotly.express as px
 
 _CAUSE_COLORS = {
     "External": "#1f77b4",
@@ -217,79 +379,93 @@ _CAUSE_COLORS = {
     "Station ops & reuse": "#2ca02c",
     "Passengers / PSH / connections": "#9be39b",
 }
+# Causes missing from the map are drawn gray, after the known ones
+_FALLBACK_COLOR = "#808080"
+_CAUSE_ORDER = tuple(_CAUSE_COLORS)
 
+def _cause_categories(causes: pd.Series) -> list:
+    present = pd.unique(causes.dropna())
+    seen = set(present)
+    return [c for c in _CAUSE_ORDER if c in seen] + [c for c in present if c not in _CAUSE_COLORS]
+
+@_cached_figure
 def stacked_100_by_attr(df_long, title: str, horizontal: bool = False):
     if df_long is None or df_long.empty:
         return None
 
-    df_plot = df_long.copy()
-    df_plot["pct"] = df_plot["pct"].fillna(0).clip(lower=0, upper=100)
-
-    # Color mapping
-    color_map = {k: _CAUSE_COLORS.get(k, '#808080') for k in df_plot["cause"].unique()}
-
+    # Sanitized shares as one array (no copy of df_long), one stacked bar trace per cause
+    pct = np.clip(np.nan_to_num(df_long["pct"].to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0), 0.0, 100.0)
+    # Integer cause codes in the fixed legend order
+    cause = pd.Categorical(df_long["cause"], categories=_cause_categories(df_long["cause"]))
+    codes = cause.codes
+    groups = df_long["group"].to_numpy(dtype=object)
     if horizontal:
-        fig = px.bar(
-            df_plot,
-            x="pct", y="group", color="cause",
-            orientation="h", title=title, barmode="stack",
-            color_discrete_map=color_map, 
-        )
-        fig.update_xaxes(range=[0, 100], ticksuffix=" %", title=None)
-        fig.update_yaxes(title=None)
         hover_template = "<b>%{y}</b><br>%{fullData.name}: %{x:.1f}%<extra></extra>"
         text_template = "%{x:.0f}%"
     else:
-        fig = px.bar(
-            df_plot,
-            x="group", y="pct", color="cause",
-            title=title, barmode="stack",
-            color_discrete_map=color_map,
-        )
-        fig.update_yaxes(range=[0, 100], ticksuffix=" %", title=None)
-        fig.update_xaxes(title=None)
         hover_template = "<b>%{x}</b><br>%{fullData.name}: %{y:.1f}%<extra></extra>"
         text_template = "%{y:.0f}%"
 
-    fig.update_traces(
-        texttemplate=text_template,
-        textposition="inside",
-        insidetextanchor="middle",
-        hovertemplate=hover_template
-    )
-
-    fig.update_layout(
-        template="plotly_white",
+    traces = []
+    for k, c in enumerate(cause.categories):
+        m = codes == k
+        traces.append(go.Bar(
+            x=pct[m] if horizontal else groups[m], y=groups[m] if horizontal else pct[m],
+            name=c, legendgroup=c, showlegend=True, marker_color=_CAUSE_COLORS.get(c, _FALLBACK_COLOR),
+            orientation="h" if horizontal else "v",
+            texttemplate=text_template, textposition="inside", insidetextanchor="middle",
+            hovertemplate=hover_template,
+        ))
+    pct_axis = dict(range=[0, 100], ticksuffix=" %", title=None)
+
+    return go.Figure(traces, layout=dict(
+        title=title,
+        barmode="stack",
+        xaxis=pct_axis if horizontal else dict(title=None),
+        yaxis=dict(title=None) if horizontal else pct_axis,
+        template=_THEME["template"],
         height=420,
         legend_title_text="Cause",
+        legend_tracegroupgap=0,
         margin=dict(l=40, r=40, t=60, b=40),
         bargap=0.15,
         uniformtext_minsize=9,
         uniformtext_mode="hide",
-    )
-    return fig
+    ))
 
+@_cached_figure
 def grouped_severity_by_cause(df_long, title: str):
+    import plotly.express as px
+
     if df_long.empty:
         return None
-    fig = px.bar(df_long, x="cause", y="pct", color="bucket", barmode="group", title=title)
-    fig.update_layout(template="plotly_white", height=420, legend_title_text="Bucket")
-    fig.update_yaxes(title="Share within bucket (%)", ticksuffix=" %")
-    fig.update_xaxes(title=None)
+    fig = px.bar(
+        df_long, x="cause", y="pct", color="bucket", barmode="group", title=title,
+        category_orders={"cause": _cause_categories(df_long["cause"])},
+    )
+    fig.update_layout(
+        template=_THEME["template"], height=420, legend_title_text="Bucket",
+        xaxis=dict(title=None), yaxis=dict(title="Share within bucket (%)", ticksuffix=" %"),
+    )
     return fig
 
+@_cached_figure
 def scatter_dominant_cause(df, title: str, x_ref: float = 90.0, y_ref: float = 30.0):
+    import plotly.express as px
+
     if df.empty:
         return None
     fig = px.scatter(
-        df, x="on_time_pct", y="avg_delay_arr_delayed_min",
+        df.assign(on_time_pct=_f32(df["on_time_pct"]), avg_delay_arr_delayed_min=_f32(df["avg_delay_arr_delayed_min"])),
+        x="on_time_pct", y="avg_delay_arr_delayed_min",
         color="dominant_cause", size="late_arr_count", hover_name="liaison",
         title=title
     )
-    fig.update_layout(template="plotly_white", height=420, legend_title_text="Dominant cause")
-    fig.update_xaxes(title="On-time %", range=[min(60, df["on_time_pct"].min()-2), 100], ticksuffix=" %")
-    fig.update_yaxes(title="Avg delay when late (min)")
-    # refs
-    fig.add_vline(x=x_ref, line_dash="dot", opacity=0.5)
-    fig.add_hline(y=y_ref, line_dash="dot", opacity=0.5)
+    fig.update_layout(
+        template=_THEME["template"], height=420, legend_title_text="Dominant cause",
+        xaxis=dict(title="On-time %", range=[min(60, df["on_time_pct"].min()-2), 100], ticksuffix=" %"),
+        yaxis=dict(title="Avg delay when late (min)"),
+        # refs
+        shapes=[_vline(x_ref, dash="dot", opacity=0.5), _hline(y_ref, dash="dot", opacity=0.5)],
+    )
     return fig
\ No newline at end of file